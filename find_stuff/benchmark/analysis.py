@@ -0,0 +1,102 @@
+'''
+Created on Oct 18, 2026
+
+'''
+from argparse import ArgumentParser
+import json
+import time
+
+from whoosh.analysis.analyzers import StemmingAnalyzer
+from whoosh.analysis.filters import Filter
+from whoosh.analysis.ngrams import NgramTokenizer
+from whoosh.fields import Schema, TEXT
+
+from find_stuff.benchmark.corpus import TextGenerator
+from find_stuff.common import cjk_analyzer, set_stem_cache_size, stem_cache_info
+
+
+class LegacyCJKFilter(Filter):
+    """the CJKFilter as it was before the character class scan, for comparison."""
+
+    def __call__(self, tokens):
+        ngt = NgramTokenizer(minsize=1, maxsize=2)
+
+        for t in tokens:
+            if len(t.text) > 0 and ord(t.text[0]) >= 0x2e80:
+                for t in ngt(t.text):
+                    t.pos = True
+                    yield t
+            else:
+                yield t
+
+def bench_analyzer(analyzer, texts, repeat):
+    """return (tokens, seconds) of analyzing `texts' `repeat' times, as the indexer does."""
+    tokens = 0
+    start = time.time()
+    for _ in range(repeat):
+        for text in texts:
+            for _ in analyzer(text, positions=True):
+                tokens += 1
+    return tokens, time.time() - start
+
+def cached_analyzer(size):
+    """return (analyzer, schema) of the indexer's content analyzer with a stemming cache of `size' words."""
+    schema = Schema(content=TEXT(analyzer=cjk_analyzer()))
+    set_stem_cache_size(schema, size)
+    return schema['content'].analyzer, schema
+
+def bench_stem_cache(texts, sizes):
+    """tokens/s and hit rate of the stemming cache for each of `sizes'."""
+    results = {}
+    for size in sizes:
+        analyzer, schema = cached_analyzer(size)
+        tokens, seconds = bench_analyzer(analyzer, texts, 1)
+        hits, misses = stem_cache_info(schema)
+        results[str(size)] = {"tokens_per_s": tokens / seconds,
+                              "hit_rate": hits / float(hits + misses) if size else None}
+    return results
+
+def run(docs=50, words=2000, cjk_ratios=(0.0, 0.2, 1.0), repeat=3, seed=0,
+        stem_cache_sizes=(0, 1000, 10000, 50000), cached_size=50000):
+    # the analyzer the indexer used before, and the one it uses now
+    analyzers = [("before", lambda: StemmingAnalyzer() | LegacyCJKFilter()),
+                 ("after", cjk_analyzer),
+                 ("after_cached", lambda: cached_analyzer(cached_size)[0])]
+    report = {}
+    for cjk_ratio in cjk_ratios:
+        gen = TextGenerator(seed, cjk_ratio=cjk_ratio)
+        texts = [u"\n\n".join(gen.paragraphs(words)) for _ in range(docs)]
+        results = {}
+        for name, factory in analyzers:
+            # a fresh stemming cache for each
+            tokens, seconds = bench_analyzer(factory(), texts, repeat)
+            results[name] = {"tokens": tokens, "seconds": seconds, "tokens_per_s": tokens / seconds}
+        for name in ("after", "after_cached"):
+            results["speedup_" + name] = results[name]["tokens_per_s"] / results["before"]["tokens_per_s"]
+        report["cjk_ratio=%g" % cjk_ratio] = results
+
+    gen = TextGenerator(seed)
+    texts = [u"\n\n".join(gen.paragraphs(words)) for _ in range(docs)]
+    report["stem_cache"] = bench_stem_cache(texts, stem_cache_sizes)
+    return report
+
+def main(argv):
+
+    argparser = ArgumentParser()
+    argparser.add_argument("--docs",type=int,default=50)
+    argparser.add_argument("--words",type=int,default=2000,help="words per document")
+    argparser.add_argument("--cjk-ratios",type=str,default="0,0.2,1")
+    argparser.add_argument("--repeat",type=int,default=3)
+    argparser.add_argument("--seed",type=int,default=0)
+    argparser.add_argument("--stem-cache-sizes",type=str,default="0,1000,10000,50000")
+    argparser.add_argument("--cached-size",type=int,default=50000,help="stemming cache of the cached analyzer")
+    opts = argparser.parse_args(argv)
+
+    report = run(opts.docs, opts.words, [float(r) for r in opts.cjk_ratios.split(",")],
+                 opts.repeat, opts.seed, [int(n) for n in opts.stem_cache_sizes.split(",")],
+                 opts.cached_size)
+    print json.dumps(report, indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    import sys
+    main(sys.argv[1:])
@@ -0,0 +1,219 @@
+'''
+Created on Oct 18, 2026
+
+'''
+from argparse import ArgumentParser
+from contextlib import closing
+from cStringIO import StringIO
+import gzip
+import json
+import os
+from os.path import exists, join
+import random
+import tarfile
+from xml.sax.saxutils import escape
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED, ZIP_STORED
+
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "to", "vi", "zen", "dor",
+             "pha", "lin", "gre", "quo", "sta", "mel", "tri", "bor", "xan", "ul"]
+
+TYPES = [".txt", ".html", ".epub", ".docx", ".zip", ".tar.gz"]
+
+class TextGenerator(object):
+    """
+    reproducible pseudo text: latin-like words drawn from a zipf-like
+    distribution, with `cjk_ratio' of the words replaced by runs of CJK
+    characters.
+    """
+
+    def __init__(self, seed=0, vocabulary=5000, cjk_ratio=0.2):
+        self.rng = random.Random(seed)
+        self.cjk_ratio = cjk_ratio
+        words = set()
+        while len(words) < vocabulary:
+            words.add(u"".join(self.rng.choice(SYLLABLES) for _ in range(self.rng.randint(1, 4))))
+        self.words = sorted(words)
+        self.rng.shuffle(self.words)
+        self.cjk = [unichr(self.rng.randint(0x4e00, 0x9fa5)) for _ in range(3000)]
+
+    def latin_word(self):
+        i = int(self.rng.paretovariate(1.1)) - 1
+        return self.words[i % len(self.words)]
+
+    def cjk_word(self):
+        return u"".join(self.rng.choice(self.cjk[:500 + int(self.rng.paretovariate(1.1))])
+                        for _ in range(self.rng.randint(2, 6)))
+
+    def word(self):
+        if self.rng.random() < self.cjk_ratio:
+            return self.cjk_word()
+        return self.latin_word()
+
+    def paragraphs(self, words):
+        paragraphs = []
+        while words > 0:
+            n = min(words, self.rng.randint(20, 120))
+            paragraphs.append(u" ".join(self.word() for _ in range(n)) + u".")
+            words -= n
+        return paragraphs
+
+    def title(self):
+        return u" ".join(self.latin_word() for _ in range(self.rng.randint(1, 4)))
+
+def writestr(z, name, data, compress_type=ZIP_DEFLATED):
+    # fixed timestamps so the same seed gives the same bytes
+    info = ZipInfo(name, (2016, 3, 21, 0, 0, 0))
+    info.compress_type = compress_type
+    z.writestr(info, data)
+
+def make_txt(gen, words):
+    return u"\n\n".join(gen.paragraphs(words)).encode('utf-8')
+
+def make_html(gen, words):
+    body = u"".join(u"<p>%s</p>\n" % escape(p) for p in gen.paragraphs(words))
+    html = (u"<html><head><meta charset=\"utf-8\"><title>%s</title>"
+            u"<style>p { margin: 0 }</style><script>var x = 1;</script></head>"
+            u"<body>\n%s</body></html>" % (escape(gen.title()), body))
+    return html.encode('utf-8')
+
+def write_docx(path, gen, words):
+    paragraphs = u"".join(u"<w:p><w:r><w:t>%s</w:t></w:r></w:p>" % escape(p)
+                          for p in gen.paragraphs(words))
+    document = (u'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                u'<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                u'<w:body>%s</w:body></w:document>' % paragraphs)
+    content_types = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                     '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                     '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                     '<Default Extension="xml" ContentType="application/xml"/>'
+                     '<Override PartName="/word/document.xml" '
+                     'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+                     '</Types>')
+    rels = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="word/document.xml"/></Relationships>')
+    with ZipFile(path, 'w', ZIP_DEFLATED) as z:
+        writestr(z, "[Content_Types].xml", content_types)
+        writestr(z, "_rels/.rels", rels)
+        writestr(z, "word/document.xml", document.encode('utf-8'))
+
+def write_epub(path, gen, words, chapters=5):
+    title = escape(gen.title())
+    container = ('<?xml version="1.0"?>'
+                 '<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+                 '<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>'
+                 '</rootfiles></container>')
+    items = []
+    spine = []
+    navpoints = []
+    with ZipFile(path, 'w', ZIP_DEFLATED) as z:
+        writestr(z, "mimetype", "application/epub+zip", ZIP_STORED)
+        writestr(z, "META-INF/container.xml", container)
+        for i in range(chapters):
+            name = "chapter%d.xhtml" % i
+            body = u"".join(u"<p>%s</p>" % escape(p) for p in gen.paragraphs(words // chapters))
+            xhtml = (u'<?xml version="1.0" encoding="utf-8"?>'
+                     u'<html xmlns="http://www.w3.org/1999/xhtml"><head><title>%s</title></head>'
+                     u'<body>%s</body></html>' % (title, body))
+            writestr(z, "OEBPS/" + name, xhtml.encode('utf-8'))
+            items.append(u'<item id="c%d" href="%s" media-type="application/xhtml+xml"/>' % (i, name))
+            spine.append(u'<itemref idref="c%d"/>' % i)
+            navpoints.append(u'<navPoint id="n%d" playOrder="%d"><navLabel><text>%d</text></navLabel>'
+                             u'<content src="%s"/></navPoint>' % (i, i + 1, i + 1, name))
+        opf = (u'<?xml version="1.0" encoding="utf-8"?>'
+               u'<package xmlns="http://www.idpf.org/2007/opf" version="2.0" unique-identifier="id">'
+               u'<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">'
+               u'<dc:title>%s</dc:title><dc:identifier id="id">bench</dc:identifier>'
+               u'<dc:language>en</dc:language></metadata>'
+               u'<manifest><item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>%s</manifest>'
+               u'<spine toc="ncx">%s</spine></package>' % (title, u"".join(items), u"".join(spine)))
+        ncx = (u'<?xml version="1.0" encoding="utf-8"?>'
+               u'<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">'
+               u'<head><meta name="dtb:uid" content="bench"/></head>'
+               u'<docTitle><text>%s</text></docTitle><navMap>%s</navMap></ncx>' % (title, u"".join(navpoints)))
+        writestr(z, "OEBPS/content.opf", opf.encode('utf-8'))
+        writestr(z, "OEBPS/toc.ncx", ncx.encode('utf-8'))
+
+def archive_members(gen, words, count):
+    for i in range(count):
+        if i % 2 == 0:
+            yield "member%d.txt" % i, make_txt(gen, words)
+        else:
+            yield "member%d.html" % i, make_html(gen, words)
+
+def write_zip(path, gen, words, count):
+    with ZipFile(path, 'w', ZIP_DEFLATED) as z:
+        for name, data in archive_members(gen, words, count):
+            writestr(z, "docs/" + name, data)
+
+def write_tar(path, gen, words, count):
+    with open(path, 'wb') as fh:
+        with closing(gzip.GzipFile(fileobj=fh, mode='wb', mtime=0)) as gz:
+            with tarfile.open(fileobj=gz, mode='w') as z:
+                for name, data in archive_members(gen, words, count):
+                    info = tarfile.TarInfo("docs/" + name)
+                    info.size = len(data)
+                    info.mtime = 0
+                    z.addfile(info, StringIO(data))
+
+def generate_corpus(path, docs=100, words=500, cjk_ratio=0.2, seed=0, types=None, members=10):
+    """
+    writes `docs' documents of about `words' words to `path', spread over
+    `types' round robin; archives hold `members' smaller documents each.
+    returns a summary of what was written.
+    """
+    types = types or TYPES
+    gen = TextGenerator(seed, cjk_ratio=cjk_ratio)
+    summary = {"docs": docs, "words": words, "cjk_ratio": cjk_ratio, "seed": seed,
+               "files": {}, "bytes": 0}
+
+    for i in range(docs):
+        ext = types[i % len(types)]
+        subdir = join(path, "d%02d" % (i % 16))
+        if not exists(subdir):
+            os.makedirs(subdir)
+        filepath = join(subdir, "doc%05d%s" % (i, ext))
+
+        if ext == ".txt":
+            with open(filepath, 'wb') as fh:
+                fh.write(make_txt(gen, words))
+        elif ext in (".html", ".htm"):
+            with open(filepath, 'wb') as fh:
+                fh.write(make_html(gen, words))
+        elif ext == ".docx":
+            write_docx(filepath, gen, words)
+        elif ext == ".epub":
+            write_epub(filepath, gen, words)
+        elif ext == ".zip":
+            write_zip(filepath, gen, max(words // members, 1), members)
+        elif ext == ".tar.gz":
+            write_tar(filepath, gen, max(words // members, 1), members)
+        else:
+            raise ValueError("unsupported type %s" % ext)
+
+        summary["files"][ext] = summary["files"].get(ext, 0) + 1
+        summary["bytes"] += os.path.getsize(filepath)
+
+    return summary
+
+def main(argv):
+
+    argparser = ArgumentParser()
+    argparser.add_argument("path",type=unicode,help="where to write the corpus")
+    argparser.add_argument("--docs",type=int,default=100)
+    argparser.add_argument("--words",type=int,default=500,help="words per document")
+    argparser.add_argument("--cjk-ratio",type=float,default=0.2)
+    argparser.add_argument("--seed",type=int,default=0)
+    argparser.add_argument("--types",type=str,default=",".join(TYPES))
+    opts = argparser.parse_args(argv)
+
+    summary = generate_corpus(opts.path, opts.docs, opts.words, opts.cjk_ratio, opts.seed,
+                              opts.types.split(","))
+    print json.dumps(summary, indent=2)
+
+if __name__ == '__main__':
+    import sys
+    main(sys.argv[1:])
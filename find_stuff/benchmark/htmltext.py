@@ -0,0 +1,75 @@
+'''
+Created on Oct 18, 2026
+
+'''
+from argparse import ArgumentParser
+import json
+import time
+
+from bs4 import BeautifulSoup
+
+from find_stuff.benchmark.corpus import TextGenerator, make_html
+from find_stuff.htmltext import html_text
+
+
+def legacy_extract_html(html):
+    """the BeautifulSoup extraction used before the streaming one, for comparison."""
+    soup = BeautifulSoup(html, "lxml")
+    for script in soup(["script", "style"]):
+        script.extract()
+    return soup.get_text()
+
+def make_docs(docs, words, cjk_ratio, seed, encoding):
+    gen = TextGenerator(seed, cjk_ratio=cjk_ratio)
+    html = [make_html(gen, words) for _ in range(docs)]
+    if encoding != 'utf-8':
+        html = [h.decode('utf-8').replace(u'charset="utf-8"', u'charset="%s"' % encoding)
+                .encode(encoding, 'xmlcharrefreplace') for h in html]
+    return html
+
+def bench_extraction(extract, docs, repeat):
+    """return (texts, seconds) of extracting the text of `docs' `repeat' times."""
+    texts = []
+    start = time.time()
+    for _ in range(repeat):
+        texts = [extract(doc) for doc in docs]
+    return texts, time.time() - start
+
+def normalize(text):
+    return u" ".join(text.split())
+
+def run(docs=100, words=2000, cjk_ratio=0.2, repeat=3, seed=0, encodings=("utf-8", "gb18030")):
+    extractors = [("before", legacy_extract_html), ("after", html_text)]
+    report = {}
+    for encoding in encodings:
+        html = make_docs(docs, words, cjk_ratio, seed, encoding)
+        size = sum(len(h) for h in html) * repeat
+        results = {}
+        texts = {}
+        for name, extract in extractors:
+            texts[name], seconds = bench_extraction(extract, html, repeat)
+            results[name] = {"seconds": seconds, "mb_per_s": size / seconds / (1024 * 1024)}
+        results["speedup"] = results["before"]["seconds"] / results["after"]["seconds"]
+        # documents whose text differs once whitespace is collapsed
+        results["same_text"] = sum(normalize(a) == normalize(b) for a, b in
+                                   zip(texts["before"], texts["after"])) / float(len(html))
+        report[encoding] = results
+    return report
+
+def main(argv):
+
+    argparser = ArgumentParser()
+    argparser.add_argument("--docs",type=int,default=100)
+    argparser.add_argument("--words",type=int,default=2000,help="words per document")
+    argparser.add_argument("--cjk-ratio",type=float,default=0.2)
+    argparser.add_argument("--repeat",type=int,default=3)
+    argparser.add_argument("--seed",type=int,default=0)
+    argparser.add_argument("--encodings",type=str,default="utf-8,gb18030")
+    opts = argparser.parse_args(argv)
+
+    report = run(opts.docs, opts.words, opts.cjk_ratio, opts.repeat, opts.seed, opts.encodings.split(","))
+    print json.dumps(report, indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    import sys
+    main(sys.argv[1:])
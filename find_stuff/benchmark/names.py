@@ -0,0 +1,84 @@
+'''
+Created on Oct 18, 2026
+
+'''
+from argparse import ArgumentParser
+import json
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from whoosh.fields import Schema, ID, TEXT
+from whoosh.index import create_in
+from whoosh.qparser.default import QueryParser
+
+from find_stuff.benchmark.corpus import TextGenerator
+from find_stuff.benchmark.runner import latency_summary
+from find_stuff.indexer import stem_ana2
+from find_stuff.names import NameIndex
+
+
+def make_paths(count, seed):
+    gen = TextGenerator(seed, cjk_ratio=0.1)
+    dirs = [u"/".join(gen.latin_word() for _ in range(gen.rng.randint(1, 4))) for _ in range(count // 20 + 1)]
+    types = [u".pdf", u".txt", u".html", u".epub", u".docx", u".chm"]
+    return [u"%s/%s_%s%s" % (gen.rng.choice(dirs), gen.word(), gen.latin_word(), gen.rng.choice(types))
+            for _ in range(count)]
+
+def bench(search, queries, repeat):
+    latencies = []
+    for _ in range(repeat):
+        for q in queries:
+            start = time.time()
+            search(q)
+            latencies.append(time.time() - start)
+    return latency_summary(latencies)
+
+def run(count=20000, repeat=5, seed=0, work_dir=None):
+    paths = make_paths(count, seed)
+    words = TextGenerator(seed).words
+    # the middle of words, as a user remembers part of a file name
+    fragments = [w[1:-1] for w in words[:10] + words[-10:] if len(w) > 4]
+
+    names = NameIndex(sqlite3.connect(":memory:"))
+    start = time.time()
+    for path in paths:
+        names.add(path)
+    report = {"paths": count, "name_index_build_s": time.time() - start}
+
+    ix = create_in(work_dir, Schema(title=TEXT(analyzer=stem_ana2, stored=True), path=ID(stored=True)))
+    writer = ix.writer()
+    for path in paths:
+        writer.add_document(title=path.rsplit(u"/", 1)[-1], path=path)
+    writer.commit()
+    parser = QueryParser("title", ix.schema)
+
+    with ix.searcher() as searcher:
+        def wildcard(fragment):
+            return len(searcher.search(parser.parse(u"*%s*" % fragment), limit=50))
+        report["whoosh_title_wildcard"] = bench(wildcard, fragments, repeat)
+    report["name_index_substring"] = bench(lambda f: names.search(f)[0], fragments, repeat)
+    report["name_index_wildcard"] = bench(lambda f: names.search(u"*%s*" % f)[0], fragments, repeat)
+    report["name_index_fuzzy"] = bench(lambda f: names.search(f + u"~")[0], fragments, repeat)
+    report["speedup"] = (report["whoosh_title_wildcard"]["p50_ms"] /
+                         max(report["name_index_substring"]["p50_ms"], 1e-6))
+    return report
+
+def main(argv):
+
+    argparser = ArgumentParser()
+    argparser.add_argument("--paths",type=int,default=20000)
+    argparser.add_argument("--repeat",type=int,default=5)
+    argparser.add_argument("--seed",type=int,default=0)
+    opts = argparser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix="find-stuff-bench-")
+    try:
+        print json.dumps(run(opts.paths, opts.repeat, opts.seed, work_dir), indent=2, sort_keys=True)
+    finally:
+        shutil.rmtree(work_dir)
+
+if __name__ == '__main__':
+    import sys
+    main(sys.argv[1:])
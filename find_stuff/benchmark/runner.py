@@ -0,0 +1,192 @@
+'''
+Created on Oct 18, 2026
+
+'''
+from argparse import ArgumentParser
+from contextlib import closing
+import json
+from logging import basicConfig, getLogger
+import multiprocessing
+import os
+from os.path import join
+import platform
+import shutil
+import tempfile
+import time
+
+import whoosh
+from whoosh.index import create_in
+
+from find_stuff.benchmark.corpus import TextGenerator, generate_corpus, TYPES
+from find_stuff.finder import Finder
+from find_stuff.indexer import (archive_handlers, get_handler, handlers, incremental_index,
+                                schema, splitext)
+from find_stuff.manifest import Manifest
+
+
+logger = getLogger("benchmark")
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    k = max(0, min(len(values) - 1, int(round(p / 100.0 * len(values) + 0.5)) - 1))
+    return values[k]
+
+def latency_summary(values):
+    return {"count": len(values),
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+            "max_ms": max(values) * 1000}
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            total += os.path.getsize(join(root, f))
+    return total
+
+def bench_handlers(corpus_path):
+    """extraction throughput per handler, archives are only read."""
+    stats = {}
+    for root, _, files in os.walk(corpus_path):
+        for f in files:
+            filepath = join(root, f)
+            _, ext = splitext(f)
+            entry = stats.setdefault(ext, {"files": 0, "errors": 0, "bytes": 0, "seconds": 0.0})
+            start = time.time()
+            try:
+                if ext in archive_handlers:
+                    for member in archive_handlers[ext].members(filepath):
+                        with closing(member.open()) as fh:
+                            fh.read()
+                else:
+                    hdr = get_handler(ext)
+                    if hdr is None:
+                        continue
+                    hdr.extract_content(filepath.encode('utf-8'))
+            except KeyboardInterrupt:
+                raise
+            except:
+                entry["errors"] += 1
+                continue
+            entry["seconds"] += time.time() - start
+            entry["files"] += 1
+            entry["bytes"] += os.path.getsize(filepath)
+
+    for entry in stats.values():
+        seconds = entry["seconds"] or 1e-9
+        entry["files_per_s"] = entry["files"] / seconds
+        entry["mb_per_s"] = entry["bytes"] / seconds / (1024 * 1024)
+    return stats
+
+def bench_index(corpus_path, index_path, jobs):
+    os.makedirs(index_path)
+    ix = create_in(index_path, schema)
+    indexables = sorted(handlers)
+    manifest = Manifest(join(index_path, "manifest.db"))
+    try:
+        start = time.time()
+        stats = incremental_index(ix, corpus_path, indexables, None, jobs, manifest=manifest)
+        full = time.time() - start
+
+        start = time.time()
+        incremental_index(ix, corpus_path, indexables, None, jobs, manifest=manifest)
+        rerun = time.time() - start
+    finally:
+        manifest.close()
+
+    docs = ix.doc_count()
+    corpus_bytes = directory_size(corpus_path)
+    return ix, {"jobs": jobs,
+                "docs": docs,
+                "seconds": full,
+                "docs_per_s": docs / full,
+                "mb_per_s": corpus_bytes / full / (1024 * 1024),
+                "no_change_rerun_seconds": rerun,
+                "stages": stats.summary()["stages"],
+                "index_bytes": directory_size(index_path)}
+
+def make_queries(seed, cjk_ratio):
+    """a fixed mix of common, rare, boolean, phrase, wildcard and CJK queries."""
+    gen = TextGenerator(seed, cjk_ratio=cjk_ratio)
+    common = gen.words[:5]
+    rare = gen.words[-5:]
+    queries = [u""]
+    queries += common
+    queries += rare
+    queries += [u"%s %s" % (common[i], common[i + 1]) for i in range(3)]
+    queries += [u"%s OR %s" % (rare[i], common[i]) for i in range(3)]
+    queries += [u"\"%s %s\"" % (common[0], common[1])]
+    queries += [u"%s*" % w[:2] for w in common[:3]]
+    queries += [u"title:%s" % w for w in common[:2]]
+    if cjk_ratio > 0:
+        queries += [gen.cjk[i] + gen.cjk[i + 1] for i in range(3)]
+    return queries
+
+def bench_queries(ix, queries, repeat):
+    results = {}
+    for name, cache_size in (("uncached", 0), ("cached", 1000)):
+        finder = Finder(ix, cache_size=cache_size)
+        latencies = []
+        for _ in range(repeat):
+            for q in queries:
+                start = time.time()
+                finder.search(q, 1)
+                latencies.append(time.time() - start)
+        results[name] = latency_summary(latencies)
+    results["queries"] = len(queries)
+    return results
+
+def run(corpus_path, work_dir, jobs=1, repeat=20, seed=0, cjk_ratio=0.2, corpus=None):
+    report = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "environment": {"python": platform.python_version(),
+                              "platform": platform.platform(),
+                              "cpu_count": multiprocessing.cpu_count(),
+                              "whoosh": ".".join(map(str, whoosh.__version__))},
+              "corpus": corpus or {"path": corpus_path}}
+
+    report["handlers"] = bench_handlers(corpus_path)
+    ix, report["indexing"] = bench_index(corpus_path, join(work_dir, "index"), jobs)
+    report["finder"] = bench_queries(ix, make_queries(seed, cjk_ratio), repeat)
+    return report
+
+def main(argv):
+
+    argparser = ArgumentParser()
+    argparser.add_argument("--corpus",type=unicode,help="an existing corpus to use instead of generating one",default=None)
+    argparser.add_argument("--docs",type=int,default=200)
+    argparser.add_argument("--words",type=int,default=1000,help="words per document")
+    argparser.add_argument("--cjk-ratio",type=float,default=0.2)
+    argparser.add_argument("--seed",type=int,default=0)
+    argparser.add_argument("--types",type=str,default=",".join(TYPES))
+    argparser.add_argument("--jobs",type=int,default=1)
+    argparser.add_argument("--repeat",type=int,default=20,help="times each query is run")
+    argparser.add_argument("--output",type=str,help="write the report to this file",default=None)
+    opts = argparser.parse_args(argv)
+
+    basicConfig(level="WARN")
+    getLogger("indexer").setLevel("WARN")
+
+    work_dir = tempfile.mkdtemp(prefix="find-stuff-bench-")
+    try:
+        corpus = None
+        corpus_path = opts.corpus
+        if corpus_path is None:
+            corpus_path = join(work_dir, u"corpus")
+            corpus = generate_corpus(corpus_path, opts.docs, opts.words, opts.cjk_ratio, opts.seed,
+                                     opts.types.split(","))
+        report = run(corpus_path, work_dir, opts.jobs, opts.repeat, opts.seed, opts.cjk_ratio, corpus)
+    finally:
+        shutil.rmtree(work_dir)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if opts.output:
+        with open(opts.output, "w") as fh:
+            fh.write(output)
+    print output
+
+if __name__ == '__main__':
+    import sys
+    main(sys.argv[1:])
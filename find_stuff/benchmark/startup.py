@@ -0,0 +1,50 @@
+'''
+Created on Oct 18, 2026
+
+'''
+from argparse import ArgumentParser
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+# what each case runs in a fresh interpreter
+CASES = {
+    "indexer": "import find_stuff.indexer",
+    # what importing the indexer cost when every handler was imported with it
+    "indexer_all_handlers": ("import find_stuff.indexer as i\n"
+                             "for registry in (i.handlers, i.archive_handlers):\n"
+                             "    for ext in registry: registry.get(ext)"),
+    "finder": "import find_stuff.finder",
+}
+
+def bench_startup(code, repeat):
+    """return the wall-clock seconds of `repeat' interpreters running `code'."""
+    times = []
+    with open(os.devnull, "w") as devnull:
+        for _ in range(repeat):
+            start = time.time()
+            subprocess.check_call([sys.executable, "-c", code], stdout=devnull, stderr=devnull)
+            times.append(time.time() - start)
+    return sorted(times)
+
+def run(repeat=10):
+    report = {}
+    for name, code in CASES.iteritems():
+        times = bench_startup(code, repeat)
+        report[name] = {"median_s": times[len(times) // 2], "min_s": times[0]}
+    report["speedup"] = report["indexer_all_handlers"]["median_s"] / report["indexer"]["median_s"]
+    return report
+
+def main(argv):
+
+    argparser = ArgumentParser()
+    argparser.add_argument("--repeat",type=int,default=10)
+    opts = argparser.parse_args(argv)
+
+    print json.dumps(run(opts.repeat), indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,175 @@
+'''
+Created on Oct 18, 2026
+
+'''
+import hashlib
+from logging import getLogger
+import os
+from os.path import exists, join
+import tempfile
+import zlib
+
+
+logger = getLogger("cache")
+
+def file_digest(path, blocksize=1 << 20):
+    h = hashlib.sha1()
+    with open(path, 'rb') as fh:
+        while True:
+            block = fh.read(blocksize)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+def data_digest(data):
+    return hashlib.sha1(data).hexdigest()
+
+def handler_id(hdr):
+    # bump a handler's `version' attribute to invalidate its cached contents
+    return "%s.%s" % (type(hdr).__name__, getattr(hdr, 'version', 1))
+
+class ExtractionCache(object):
+    """
+    on-disk cache of extracted contents keyed by content hash and handler,
+    stored zlib compressed under `cache_path'. entries are touched on every
+    hit, `evict' removes the least recently used ones above `max_size' bytes.
+    the size of the cache is kept in SIZE_FILE as of the last eviction, the
+    sizes of the entries put since are appended to ADDED_FILE by every
+    process putting entries, so the cache is only walked once their sum
+    exceeds `max_size'.
+    """
+
+    SIZE_FILE = "size"
+    ADDED_FILE = "added"
+
+    def __init__(self, cache_path, max_size=0):
+        self.cache_path = cache_path
+        self.max_size = max_size
+        if not exists(cache_path):
+            os.makedirs(cache_path)
+
+    def key(self, digest, hdr, limit=0):
+        ident = handler_id(hdr)
+        if limit:
+            # truncated contents
+            ident += ":%d" % limit
+        return hashlib.sha1("%s:%s" % (ident, digest)).hexdigest()
+
+    def _entry_path(self, key):
+        return join(self.cache_path, key[:2], key[2:] + ".z")
+
+    def get(self, key):
+        entry = self._entry_path(key)
+        try:
+            with open(entry, 'rb') as fh:
+                data = fh.read()
+            content = unicode(zlib.decompress(data), encoding='utf-8')
+        except (IOError, OSError):
+            return None
+        except zlib.error:
+            logger.warn("corrupted cache entry %s", entry)
+            return None
+
+        try:
+            os.utime(entry, None)
+        except OSError:
+            pass
+        return content
+
+    def put(self, key, content):
+        if isinstance(content, unicode):
+            content = content.encode('utf-8')
+        entry = self._entry_path(key)
+        entry_dir = os.path.dirname(entry)
+        if not exists(entry_dir):
+            try:
+                os.makedirs(entry_dir)
+            except OSError:
+                # created by another worker
+                pass
+
+        # write then rename so concurrent readers never see partial entries
+        data = zlib.compress(content)
+        fd, tmp = tempfile.mkstemp(dir=entry_dir)
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(data)
+            os.rename(tmp, entry)
+        except:
+            os.remove(tmp)
+            raise
+        self._added(len(data))
+
+    def _added(self, size):
+        if not self.max_size:
+            return
+        # appends this short are atomic, workers don't need a lock
+        fd = os.open(join(self.cache_path, self.ADDED_FILE), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0644)
+        try:
+            os.write(fd, "%d\n" % size)
+        finally:
+            os.close(fd)
+
+    def size(self):
+        """an upper bound of the size of the entries, None if it isn't known."""
+        try:
+            with open(join(self.cache_path, self.SIZE_FILE), 'rb') as fh:
+                total = int(fh.read())
+        except (IOError, OSError, ValueError):
+            return None
+        try:
+            with open(join(self.cache_path, self.ADDED_FILE), 'rb') as fh:
+                total += sum(int(line) for line in fh)
+        except (IOError, OSError):
+            pass
+        except ValueError:
+            return None
+        return total
+
+    def evict(self):
+        if not self.max_size:
+            return 0
+        total = self.size()
+        if total is not None and total <= self.max_size:
+            return 0
+
+        # entries put during the walk may be counted twice, which errs on
+        # the side of walking again
+        try:
+            os.remove(join(self.cache_path, self.ADDED_FILE))
+        except OSError:
+            pass
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.cache_path):
+            if root == self.cache_path:
+                continue
+            for f in files:
+                p = join(root, f)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, p))
+                total += st.st_size
+
+        removed = 0
+        entries.sort()
+        for _, size, p in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(p)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+
+        fd, tmp = tempfile.mkstemp(dir=self.cache_path)
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write("%d" % total)
+        os.rename(tmp, join(self.cache_path, self.SIZE_FILE))
+        if removed > 0:
+            logger.info("evicted %d cache entries", removed)
+        return removed
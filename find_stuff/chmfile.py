@@ -3,9 +3,12 @@ Created on Mar 22, 2016
 
 '''
 #http://code.activestate.com/recipes/502221-extracting-data-from-chm-microsoft-compiled-html/
+from chm import chmlib
 from chm.chm import CHMFile
 from HTMLParser import HTMLParser
+import posixpath
 import re
+import urllib
 
 class LinksLocator(HTMLParser):
     """
@@ -52,6 +55,35 @@ class LinksLocator(HTMLParser):
 
 class ChmFileException(Exception): pass
 
+html_re = re.compile(r"\.[xs]?html?$", re.IGNORECASE)
+
+def normalize_path(local):
+    """
+    return the absolute path of the object a TopicsTree `local' refers to,
+    without #anchor or ?query, None if it points outside of the archive.
+    """
+    if '::' in local:
+        # ms-its:file.chm::/path
+        local = local.split('::', 1)[1]
+    elif ':' in local.split('/', 1)[0]:
+        # http:, mailto:, javascript:...
+        return None
+    local = local.split('#', 1)[0].split('?', 1)[0]
+    local = urllib.unquote(local).replace('\\', '/').strip()
+    if not local:
+        return None
+    return posixpath.normpath('/' + local.lstrip('/'))
+
+def unique_paths(locals_):
+    """the distinct paths of `locals_' in order, chmlib resolves paths ignoring case."""
+    seen = set()
+    for local in locals_:
+        path = normalize_path(local)
+        if path is None or path.lower() in seen:
+            continue
+        seen.add(path.lower())
+        yield path
+
 class SimpleChmFile(CHMFile):
     """
     SimpleChmFile is a wraper over CHMFile in witch you can iterate over
@@ -61,22 +93,34 @@ class SimpleChmFile(CHMFile):
     >>> for page in chm:
     ...     print page
 
-    the output will be html content of compresed chm file
+    the output will be html content of compresed chm file, each page once
+    however many entries of the Content Tree point to it. with
+    `all_objects', every html object of the archive is listed instead of
+    the pages of the Content Tree.
     """
-    def __init__(self, filename=None):
+    def __init__(self, filename=None, all_objects=False):
         CHMFile.__init__(self)
+        self.all_objects = all_objects
         self.nodes = []
         if filename:
             self.open(filename)
 
     def __iter__(self):
-        """return generator over pages in Content Tree."""
-        for node in self.nodes:
-            yield self._get_contents(node['Local'])
+        """return generator over pages, fetched as they are consumed."""
+        for path in self.paths():
+            yield self._get_contents(path)
+
+    def paths(self):
+        """return the distinct paths of the pages."""
+        if self.all_objects:
+            return self._get_objects()
+        return list(unique_paths(node['Local'] for node in self.nodes if node.get('Local')))
 
     def open(self, filename):
         if CHMFile.LoadCHM(self, filename) != 1:
             raise IOError, "Can't load File '%s'" % filename
+        if self.all_objects:
+            return
         self.nodes = self._get_nodes()
         if not self.nodes:
             raise ChmFileException, "Can't find Content Tree"
@@ -89,6 +133,17 @@ class SimpleChmFile(CHMFile):
         html = CHMFile.RetrieveObject(self, obj[1])
         return html[1]
 
+    def _get_objects(self):
+        """return the paths of the html objects in the archive."""
+        paths = []
+        def collect(chmfile, ui, context):
+            if html_re.search(ui.path):
+                paths.append(ui.path)
+            return chmlib.CHM_ENUMERATOR_CONTINUE
+        chmlib.chm_enumerate(self.file, chmlib.CHM_ENUMERATE_NORMAL | chmlib.CHM_ENUMERATE_FILES,
+                             collect, None)
+        return paths
+
     def _get_nodes(self):
         """return list of dictionaries with data extracted from TopicsTree."""
         parser = LinksLocator()
@@ -102,7 +157,6 @@ class SimpleChmFile(CHMFile):
             obj = self._get_contents(self.home)
             if not obj:
                 raise ChmFileException, "Can't find Content Tree"
-            print obj
             parser.feed(obj)
             # sometimes the first page of archive contains link to its
             # Content Tree
@@ -115,10 +169,4 @@ class SimpleChmFile(CHMFile):
                     break
             nodes = parser.links
         parser.close()
-        # fix absolute path if nessesery
-        for obj in nodes:
-            if obj['Local'][0] != '/':
-                obj['Local'] = "/" + obj['Local']
-#                 obj['Local'] = home_dir + obj['Local']
-#            print obj['Local']
         return nodes
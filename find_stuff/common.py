@@ -2,9 +2,17 @@
 Created on Mar 21, 2016
 
 '''
+from collections import OrderedDict
 import json
-from whoosh.analysis.filters import Filter
-from whoosh.analysis.ngrams import NgramTokenizer
+import re
+import sys
+import threading
+
+from whoosh.analysis.filters import Filter, LowercaseFilter, StopFilter
+from whoosh.analysis.morph import StemFilter
+from whoosh.analysis.tokenizers import RegexTokenizer, default_pattern
+from whoosh.columns import VarBytesListColumn
+from whoosh.fields import ID
 
 
 config_file = "indexer.json"
@@ -14,19 +22,254 @@ def load_config():
         config = json.load(fh)
     return config
 
+class LRUCache(object):
+    """
+    thread-safe mapping of at most `size' items, dropping the least
+    recently used ones. counts hits and misses.
+    """
+    
+    def __init__(self, size=1000):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.items.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self.items[key] = value
+            self.hits += 1
+            return value
+    
+    def put(self, key, value):
+        with self.lock:
+            self.items.pop(key, None)
+            self.items[key] = value
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+    
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+    
+    def stats(self):
+        return {"size": len(self.items), "hits": self.hits, "misses": self.misses}
+
+# CJK radicals and symbols, kana, bopomofo, hangul, ideographs, Yi, and
+# compatibility and fullwidth forms; ideographs beyond the BMP on wide builds
+cjk_chars = u"\u2e80-\u2fdf\u2ff0-\u9fff\ua000-\ua4cf\uac00-\ud7af\uf900-\ufaff\ufe30-\ufe4f\uff00-\uffef"
+if sys.maxunicode > 0xffff:
+    cjk_chars += u"\U00020000-\U0002fa1f"
+cjk_re = re.compile(u"[%s]+" % cjk_chars)
+
 # https://gist.github.com/lukhnos/8800394
 class CJKFilter(Filter):
+    """
+    replaces the CJK runs in tokens by their overlapping unigrams and
+    bigrams, the other parts of mixed tokens are kept as tokens of their
+    own. tokens without CJK pass through untouched, the positions of the
+    tokens after a run are shifted by its length.
+    """
+    
     def __call__(self, tokens):
-        ngt = NgramTokenizer(minsize=1, maxsize=2)
-
+        search = cjk_re.search
+        finditer = cjk_re.finditer
+        shift = 0
         for t in tokens:
-            if len(t.text) > 0 and ord(t.text[0]) >= 0x2e80:
-                for t in ngt(t.text):
-                    t.pos = True
+            if shift:
+                t.pos += shift
+            text = t.text
+            if not search(text):
+                yield t
+                continue
+            
+            # the token object is reused for every piece, as whoosh filters do
+            first = pos = t.pos if t.positions else 0
+            startchar = t.startchar if t.chars else 0
+            last = 0
+            for m in finditer(text):
+                start, end = m.span()
+                if start > last:
+                    t.text = text[last:start]
+                    t.pos = pos
+                    t.startchar = startchar + last
+                    t.endchar = startchar + start
                     yield t
-            else:
+                    pos += 1
+                for i in xrange(start, end):
+                    t.text = text[i]
+                    t.pos = pos
+                    t.startchar = startchar + i
+                    t.endchar = startchar + i + 1
+                    yield t
+                    if i + 1 < end:
+                        t.text = text[i:i + 2]
+                        t.endchar += 1
+                        yield t
+                    pos += 1
+                last = end
+            if last < len(text):
+                t.text = text[last:]
+                t.pos = pos
+                t.startchar = startchar + last
+                t.endchar = startchar + len(text)
                 yield t
+                pos += 1
+            
+            if t.positions:
+                shift += pos - first - 1
+
+class CJKStopFilter(StopFilter):
+    """
+    StopFilter for the tokens of CJKFilter: CJK unigrams are kept whatever
+    `minsize', and renumbering keeps the tokens sharing a position, as a
+    bigram and its first unigram, at the same position.
+    """
+    
+    def __call__(self, tokens):
+        stoplist = self.stops
+        minsize = self.min
+        maxsize = self.max
+        renumber = self.renumber
+        search = cjk_re.search
+        
+        pos = last = None
+        for t in tokens:
+            text = t.text
+            if ((len(text) >= minsize or search(text))
+                and (maxsize is None or len(text) <= maxsize)
+                and text not in stoplist):
+                if renumber and t.positions:
+                    if pos is None:
+                        pos = t.pos
+                    elif t.pos != last:
+                        pos += 1
+                    last = t.pos
+                    t.pos = pos
+                t.stopped = False
+                yield t
+            elif not t.removestops:
+                t.stopped = True
+                yield t
+
+def cjk_analyzer(expression=default_pattern):
+    """
+    a StemmingAnalyzer splitting the CJK runs of tokens first, so that the
+    other parts of mixed tokens are lowercased, stopped and stemmed as
+    words of their own.
+    """
+    return (RegexTokenizer(expression=expression) | CJKFilter() | LowercaseFilter() |
+            CJKStopFilter() | StemFilter())
+
+class StemCache(object):
+    """
+    bounded cache of the stems of `stemfn'. words are kept in two
+    generations of at most `size' / 2 words each, the older one being
+    dropped when the newer one is full; words looked up since are moved to
+    the newer one. so it behaves like a least recently used cache without
+    recency bookkeeping on every token.
+    """
+    
+    def __init__(self, stemfn, size):
+        self.stemfn = stemfn
+        self.half = max(1, size // 2)
+        self.recent = {}
+        self.older = {}
+        self.hits = 0
+        self.misses = 0
+    
+    def __call__(self, word):
+        stem = self.recent.get(word)
+        if stem is not None:
+            self.hits += 1
+            return stem
+        
+        stem = self.older.pop(word, None)
+        if stem is None:
+            self.misses += 1
+            stem = self.stemfn(word)
+        else:
+            self.hits += 1
+        if len(self.recent) >= self.half:
+            self.older = self.recent
+            self.recent = {}
+        self.recent[word] = stem
+        return stem
+    
+    def cache_info(self):
+        return self.hits, self.misses, self.half * 2, len(self.recent) + len(self.older)
+
+class LRUStemFilter(StemFilter):
+    """
+    StemFilter with a StemCache of `cachesize' words, no cache if it is 0.
+    whoosh's own cache is least frequently used, and unbounded with -1.
+    """
+    
+    def clear(self):
+        if self.lang:
+            from whoosh.lang import stemmer_for_language
+            stemfn = stemmer_for_language(self.lang)
+        else:
+            stemfn = self.stemfn
+        
+        if self.cachesize > 0:
+            self._stem = StemCache(stemfn, self.cachesize)
+        else:
+            self._stem = stemfn
+    
+    def cache_info(self):
+        if isinstance(self._stem, StemCache):
+            return self._stem.cache_info()
+        return None
+
+def stem_filters(schema):
+    """yield (items, index) of the StemFilters in the analyzers of `schema'."""
+    for name in schema.names():
+        items = getattr(getattr(schema[name], 'analyzer', None), 'items', ())
+        for i, item in enumerate(items):
+            if isinstance(item, StemFilter):
+                yield items, i
+
+def set_stem_cache_size(schema, size):
+    """give the stemmers of `schema' a StemCache of `size' words, returns whether any changed."""
+    changed = False
+    for items, i in stem_filters(schema):
+        item = items[i]
+        if not isinstance(item, LRUStemFilter) or item.cachesize != size:
+            items[i] = LRUStemFilter(item.stemfn, item.lang, item.ignore, size)
+            changed = True
+    return changed
+
+def stem_cache_info(schema):
+    """return (hits, misses) of the stemming caches of `schema'."""
+    hits = misses = 0
+    for items, i in stem_filters(schema):
+        info = items[i].cache_info()
+        if info is not None:
+            hits += info[0]
+            misses += info[1]
+    return hits, misses
 
+class MultiID(ID):
+    """
+    ID field holding a list of values, each indexed as a term and all of
+    them kept in its column, for filtering and counting hits by any of
+    them.
+    """
+    
+    def __init__(self, stored=False):
+        ID.__init__(self, stored=stored)
+        self.column_type = VarBytesListColumn()
+    
+    def to_column_value(self, value):
+        if not isinstance(value, (list, tuple)):
+            value = [value]
+        return [self.to_bytes(v) for v in value]
 
 # def save_config(config):
 #     with open(config_file,"w") as fh:
@@ -2,62 +2,385 @@
 Created on Mar 21, 2016
 
 '''
+from argparse import ArgumentParser
+from collections import namedtuple
+from contextlib import contextmanager
+import heapq
+from itertools import islice
 from logging import basicConfig, getLogger
-from whoosh import query
+import math
+import multiprocessing
+from os.path import exists, join
+import posixpath
+import Queue
+import signal
+import threading
+import time
+from whoosh import query, sorting
 from whoosh.index import open_dir
 from whoosh.qparser.default import QueryParser
 
-from find_stuff.common import load_config, CJKFilter  # @UnusedImport
+from find_stuff.common import load_config, CJKFilter, LRUCache  # @UnusedImport
+from find_stuff.manifest import Manifest
+from find_stuff.shards import shard_dirs
 
 
 logger = getLogger("finder")
 
-def main(argv):
+def parse_date(s):
+    """epoch seconds of the local date "YYYY-MM-DD" `s'."""
+    return int(time.mktime(time.strptime(s.strip(), "%Y-%m-%d")))
+
+class SearchOptions(namedtuple("SearchOptions", "filetype topdir after before newest counts")):
+    """
+    restricts a search to documents of a filetype, under a top-level
+    directory or modified in [after, before) (epoch seconds), orders it by
+    modification time with `newest' and counts the hits per filetype with
+    `counts'. all of them are read from columns, not stored fields. a
+    document matches and is counted for the filetypes and top-level
+    directories of all copies of its content.
+    """
+    __slots__ = ()
+
+    def __new__(cls, filetype=None, topdir=None, after=None, before=None, newest=False, counts=False):
+        return super(SearchOptions, cls).__new__(cls, filetype, topdir, after, before, newest, counts)
+
+    def filter(self):
+        """the query documents have to match as well, None if there is none."""
+        terms = []
+        if self.filetype:
+            terms.append(query.Term("filetype", self.filetype))
+        if self.topdir:
+            terms.append(query.Term("topdir", self.topdir))
+        if self.after is not None or self.before is not None:
+            terms.append(query.NumericRange("mtime", self.after, self.before, endexcl=True))
+        if not terms:
+            return None
+        return terms[0] if len(terms) == 1 else query.And(terms)
+
+    def search_args(self):
+        kwargs = {}
+        if self.newest:
+            kwargs['sortedby'] = "mtime"
+            kwargs['reverse'] = True
+        if self.counts:
+            kwargs['groupedby'] = {"filetype": sorting.FieldFacet("filetype", allow_overlap=True,
+                                                                  maptype=sorting.Count)}
+        return kwargs
+
+no_options = SearchOptions()
+
+class Locations(object):
+    """
+    adds the paths of all copies of a hit's content from the manifest at
+    `db_path', and finds paths by name in its NameIndex. the threads
+    share one connection, used by one at a time.
+    """
+
+    def __init__(self, db_path):
+        self.manifest = Manifest(db_path, shared=True)
+        self.lock = threading.Lock()
+
+    def find_names(self, querystring, limit):
+        start = time.time()
+        with self.lock:
+            total, paths = self.manifest.names.search(querystring, limit)
+        return {"query": querystring, "total": total, "seconds": time.time() - start,
+                "hits": [{"path": path, "title": posixpath.basename(path), "rank": i}
+                         for i, path in enumerate(paths)]}
+
+    def add_paths(self, hits):
+        with self.lock:
+            for hit in hits:
+                if hit.get('digest'):
+                    hit['paths'] = [path for path, _ in self.manifest.locations(hit['digest'])]
+
+    def close(self):
+        with self.lock:
+            self.manifest.close()
+
+def result_page(querystring, total, page, pagecount, hits, counts):
+    result = {"query": querystring, "total": total, "page": page,
+              "pagecount": pagecount, "hits": hits}
+    if counts is not None:
+        result["counts"] = counts
+    return result
+
+class Finder(object):
+    """
+    searches the index with a pool of `size' searchers that are kept open
+    and refreshed when the index changes, so queries don't pay for opening
+    the index.
     
+    parsed queries and the top `window' (docnum, score) pairs of recent
+    queries are cached, results are keyed by index generation so a commit
+    invalidates them. with a manifest, hits list the paths of all copies
+    of their content. searches take SearchOptions; sorted by time, hits
+    have no score.
+    """
+
+    def __init__(self, ix, size=1, pagelen=20, cache_size=1000, window=200, manifest_path=None):
+        self.ix = ix
+        self.locations = Locations(manifest_path) if manifest_path else None
+        self.pagelen = pagelen
+        self.window = window
+        self.parser = QueryParser("content", ix.schema)
+        self.queries = LRUCache(cache_size)
+        self.results = LRUCache(cache_size)
+        self.generation = -1
+        self.searchers = Queue.Queue()
+        for _ in range(size):
+            self.searchers.put(ix.searcher())
+
+    @contextmanager
+    def searcher(self):
+        searcher = self.searchers.get()
+        try:
+            if not searcher.up_to_date():
+                searcher = searcher.refresh()
+            yield searcher
+        finally:
+            self.searchers.put(searcher)
+
+    def parse(self, querystring):
+        querystring = querystring.strip()
+        if querystring == "":
+            return query.Every()
+        q = self.queries.get(querystring)
+        if q is None:
+            q = self.parser.parse(querystring)
+            self.queries.put(querystring, q)
+        return q
+
+    def _scored(self, searcher, querystring, limit, options=no_options):
+        """return (total, [(docnum, score), ...], counts) of at least the top `limit' hits."""
+        generation = searcher.reader().generation()
+        if generation > self.generation:
+            # entries of older generations can't be hit anymore
+            self.generation = generation
+            self.results.clear()
+
+        key = (generation, querystring.strip(), options)
+        cached = self.results.get(key)
+        if cached is not None:
+            total, scored, _ = cached
+            if len(scored) >= limit or len(scored) == total:
+                return cached
+            limit = max(limit, len(scored) * 2)
+
+        results = searcher.search(self.parse(querystring), limit=max(limit, self.window),
+                                  filter=options.filter(), **options.search_args())
+        # the "score" of hits sorted by a column is their sort key
+        scored = [(hit.docnum, None if options.newest else hit.score) for hit in results]
+        counts = None
+        if options.counts:
+            # the keys of a list column are its bytes
+            counts = dict((filetype.decode('utf-8'), count) for filetype, count in results.groups("filetype").iteritems())
+        cached = (len(results), scored, counts)
+        self.results.put(key, cached)
+        return cached
+
+    def search(self, querystring, page=1, pagelen=None, options=no_options):
+        pagelen = pagelen or self.pagelen
+        with self.searcher() as searcher:
+            total, scored, counts = self._scored(searcher, querystring, page * pagelen, options)
+            pagecount = int(math.ceil(total / float(pagelen)))
+            page = max(1, min(page, pagecount))
+            start = (page - 1) * pagelen
+            hits = [dict(searcher.stored_fields(docnum), score=score, rank=start + i)
+                    for i, (docnum, score) in enumerate(scored[start:start + pagelen])]
+        if self.locations is not None:
+            self.locations.add_paths(hits)
+        return result_page(querystring, total, page, pagecount, hits, counts)
+
+    def top(self, querystring, limit, options=no_options):
+        """return (total, [(score, stored fields), ...], counts) of the top `limit' hits."""
+        with self.searcher() as searcher:
+            total, scored, counts = self._scored(searcher, querystring, limit, options)
+            return total, [(score, searcher.stored_fields(docnum)) for docnum, score in scored[:limit]], counts
+
+    def find_names(self, querystring, limit=None):
+        """the paths matching `querystring', see NameIndex."""
+        if self.locations is None:
+            raise ValueError("the index has no manifest to find names in")
+        return self.locations.find_names(querystring, limit or self.pagelen)
+
+    def status(self):
+        with self.searcher() as searcher:
+            return {"doc_count": searcher.doc_count(),
+                    "generation": searcher.reader().generation(),
+                    "query_cache": self.queries.stats(),
+                    "result_cache": self.results.stats()}
+
+    def close(self):
+        while not self.searchers.empty():
+            self.searchers.get().close()
+        if self.locations is not None:
+            self.locations.close()
+
+# the Finder of the shard served by a ShardedFinder worker process
+_shard = None
+
+def _open_shard(index_dir, cache_size, window):
+    global _shard
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _shard = Finder(open_dir(index_dir), cache_size=cache_size, window=window)
+
+def _shard_top(querystring, limit, options):
+    return _shard.top(querystring, limit, options)
+
+def _shard_status():
+    return _shard.status()
+
+class ShardedFinder(object):
+    """
+    searches the shards of a sharded index in parallel, each shard is
+    searched by a pool of `size' processes running a Finder. the top hits
+    of the shards are merged by score, or time when sorted by time, and
+    their hit counts are added up; shards are assigned by a hash of the
+    path, so their term statistics and scores are comparable.
+    """
+
+    def __init__(self, shard_dirs, size=1, pagelen=20, cache_size=1000, window=200, manifest_path=None):
+        self.pagelen = pagelen
+        self.locations = Locations(manifest_path) if manifest_path else None
+        self.pools = [multiprocessing.Pool(size, _open_shard, (d, cache_size, window)) for d in shard_dirs]
+
+    def search(self, querystring, page=1, pagelen=None, options=no_options):
+        pagelen = pagelen or self.pagelen
+        # the page can only hold hits within the top page * pagelen of each shard
+        results = [pool.apply_async(_shard_top, (querystring, page * pagelen, options)) for pool in self.pools]
+        total = 0
+        ranked = []
+        counts = {} if options.counts else None
+        for shard, result in enumerate(results):
+            shard_total, hits, shard_counts = result.get()
+            total += shard_total
+            if options.newest:
+                ranked.append([(-int(fields.get('time', 0)), shard, i, None, fields) for i, (_, fields) in enumerate(hits)])
+            else:
+                ranked.append([(-score, shard, i, score, fields) for i, (score, fields) in enumerate(hits)])
+            for filetype, count in (shard_counts or {}).iteritems():
+                counts[filetype] = counts.get(filetype, 0) + count
+
+        pagecount = int(math.ceil(total / float(pagelen)))
+        page = max(1, min(page, pagecount))
+        start = (page - 1) * pagelen
+        merged = islice(heapq.merge(*ranked), start, start + pagelen)
+        hits = [dict(fields, score=score, rank=start + i)
+                for i, (_, _, _, score, fields) in enumerate(merged)]
+        if self.locations is not None:
+            self.locations.add_paths(hits)
+        return result_page(querystring, total, page, pagecount, hits, counts)
+
+    def find_names(self, querystring, limit=None):
+        """the paths matching `querystring', see NameIndex."""
+        if self.locations is None:
+            raise ValueError("the index has no manifest to find names in")
+        return self.locations.find_names(querystring, limit or self.pagelen)
+
+    def status(self):
+        results = [pool.apply_async(_shard_status) for pool in self.pools]
+        shards = [result.get() for result in results]
+        return {"doc_count": sum(shard['doc_count'] for shard in shards),
+                "generation": [shard['generation'] for shard in shards],
+                "shards": shards}
+
+    def close(self):
+        for pool in self.pools:
+            pool.terminate()
+            pool.join()
+        if self.locations is not None:
+            self.locations.close()
+
+def open_finder(index_path, size=1, cache_size=1000):
+    """a Finder of the index at index_path, or a ShardedFinder if it is sharded."""
+    manifest_path = join(index_path, "manifest.db")
+    if not exists(manifest_path):
+        manifest_path = None
+    shards = shard_dirs(index_path)
+    if shards:
+        return ShardedFinder(shards, size, cache_size=cache_size, manifest_path=manifest_path)
+    return Finder(open_dir(index_path), size, cache_size=cache_size, manifest_path=manifest_path)
+
+def main(argv):
+
+    argparser = ArgumentParser()
+    argparser.add_argument("--serve",action="store_true",help="answer queries over http instead of interactively")
+    argparser.add_argument("--host",type=str,help="address to serve on",default=None)
+    argparser.add_argument("--port",type=int,help="port to serve on",default=None)
+    argparser.add_argument("--type",type=str,help="only find files of this type, e.g. .pdf",default=None)
+    argparser.add_argument("--dir",type=str,help="only find files under this top-level directory",default=None)
+    argparser.add_argument("--after",type=str,help="only find files modified on or after YYYY-MM-DD",default=None)
+    argparser.add_argument("--before",type=str,help="only find files modified before YYYY-MM-DD",default=None)
+    argparser.add_argument("--newest",action="store_true",help="list the most recently modified files first")
+    argparser.add_argument("--counts",action="store_true",help="count the hits per file type")
+    argparser.add_argument("--names",action="store_true",help="find files by name: a substring, a wildcard pattern or a fuzzy name~")
+    opts = argparser.parse_args(argv)
+
     basicConfig(level="INFO")
     getLogger().setLevel("WARN")
     logger.setLevel("INFO")
-    
+
     config = load_config()
     index_path = config['index_path']
-    
-    ix = open_dir(index_path)
-    searcher = ix.searcher()
-    
-    print "Doc count=%d"%searcher.doc_count()
+
+    if opts.serve:
+        from find_stuff.server import serve
+        getLogger("server").setLevel("INFO")
+        finder = open_finder(index_path, config.get('searchers', 4), config.get('finder_cache_size', 1000))
+        try:
+            serve(finder, opts.host or config.get('server_host', "127.0.0.1"),
+                  opts.port or config.get('server_port', 8080))
+        finally:
+            finder.close()
+        return
+
+    try:
+        options = SearchOptions(opts.type and unicode(opts.type, 'utf-8'), opts.dir and unicode(opts.dir, 'utf-8'),
+                                opts.after and parse_date(opts.after), opts.before and parse_date(opts.before),
+                                opts.newest, opts.counts)
+    except ValueError, e:
+        argparser.error(str(e))
+
+    finder = open_finder(index_path)
+
+    print "Doc count=%d"%finder.status()['doc_count']
     while True:
         try:
             querystring = raw_input("find something? >")
         except KeyboardInterrupt:
-            print 
+            print
             break
-        with ix.searcher() as searcher:
-            querystring = querystring.strip()
-            if querystring == "":
-                q = query.Every()
-            else:
-                parser = QueryParser("content", ix.schema)
-                q = parser.parse(querystring)
-            results = searcher.search_page(q, 1, pagelen=20)
-            if len(results) == 0:
-                print "No result"
-            else:
-                print "Found %d results"%len(results)
-                quit_ =False
-                for p in range(1, results.pagecount+1):
-                    while not quit_:
-                        for i, hit in enumerate(results):
-                            print "%d >> %s" %(i + (p-1)*20 + 1,hit)
-                        inp = raw_input("Page %d/%d, (Enter: next page|q: quit) ? >" % (p, results.pagecount))
-                        if inp.strip() == 'q':
-                            quit_ = True
-                        else:
-                            if p < results.pagecount:
-                                results = searcher.search_page(q, p+1, pagelen=20)
-                            break
-                    if quit_:
+        if opts.names:
+            results = finder.find_names(querystring)
+            print "Found %d files in %.3fs" % (results['total'], results['seconds'])
+            for hit in results['hits']:
+                print "%d >> %s" % (hit['rank'] + 1, hit['path'])
+            continue
+        results = finder.search(querystring, 1, options=options)
+        if results['total'] == 0:
+            print "No result"
+        else:
+            print "Found %d results"%results['total']
+            if 'counts' in results:
+                print ", ".join("%s: %d" % (filetype or "(none)", count) for filetype, count in
+                                sorted(results['counts'].items(), key=lambda item: -item[1]))
+            quit_ =False
+            for p in range(1, results['pagecount']+1):
+                while not quit_:
+                    for hit in results['hits']:
+                        print "%d >> %s" %(hit.pop('rank') + 1,hit)
+                    inp = raw_input("Page %d/%d, (Enter: next page|q: quit) ? >" % (p, results['pagecount']))
+                    if inp.strip() == 'q':
+                        quit_ = True
+                    else:
+                        if p < results['pagecount']:
+                            results = finder.search(querystring, p+1, options=options)
                         break
-            
+                if quit_:
+                    break
+
 if __name__ == '__main__':
     import sys
-    main(sys.argv)
+    main(sys.argv[1:])
@@ -0,0 +1,130 @@
+'''
+Created on Oct 18, 2026
+
+'''
+import codecs
+from functools import partial
+from importlib import import_module
+from logging import getLogger
+
+
+logger = getLogger("indexer")
+
+def to_utf8(v):
+    if type(v) == str:
+        return unicode(v, encoding='utf-8',errors='replace')
+    return v
+
+def join_chunks(chunks, limit=0):
+    """
+    joins the text chunks yielded by a handler, stopping the handler once
+    `limit' characters have been read.
+    """
+    parts = []
+    size = 0
+    try:
+        for chunk in chunks:
+            chunk = to_utf8(chunk)
+            if limit and size + len(chunk) > limit:
+                parts.append(chunk[:limit - size])
+                logger.info("content truncated to %d characters", limit)
+                break
+            parts.append(chunk)
+            size += len(chunk)
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+    return u"".join(parts)
+
+class Handler(object):
+    """
+    handlers yield the text of a document in chunks (pages, chapters,
+    topics...) from iter_content(filepath). handlers that also implement
+    iter_stream(fh) can read archive members from memory, the others are
+    given a path to a spilled copy.
+    """
+
+    def iter_content(self, filepath):
+        with open(filepath, "rb") as fh:
+            for chunk in self.iter_stream(fh):
+                yield chunk
+
+    def extract_content(self, filepath, limit=0):
+        return join_chunks(self.iter_content(filepath), limit)
+
+class TxtHandler(Handler):
+
+    def iter_stream(self, fh):
+        reader = codecs.getreader('utf-8')(fh)
+        for chunk in iter(partial(reader.read, 1 << 16), u""):
+            yield chunk
+
+class ArchiveMember(object):
+    """
+    a file inside an archive, `open' returns a file-like object that is
+    only valid until the archive moves on to the next member.
+    """
+
+    def __init__(self, name, size, opener, sig=None):
+        self.name = to_utf8(name)
+        self.size = size
+        self.open = opener
+        # crc/size/mtime recorded in the archive, None if unknown
+        self.sig = sig
+
+class HandlerRegistry(object):
+    """
+    maps extensions to handlers, given either as instances or as
+    "module:Class" to be imported with the libraries it needs the first
+    time the extension is looked up. an extension whose libraries are
+    missing is reported once and has no handler.
+    """
+
+    def __init__(self):
+        self.specs = {}
+        # spec -> handler, None if it failed to load
+        self.loaded = {}
+
+    def register(self, ext, spec, **kwargs):
+        if isinstance(spec, basestring):
+            spec = (spec, tuple(sorted(kwargs.items())))
+        self.specs[ext] = spec
+
+    def __setitem__(self, ext, handler):
+        self.register(ext, handler)
+
+    def __contains__(self, ext):
+        return ext in self.specs
+
+    def __iter__(self):
+        return iter(self.specs)
+
+    def __len__(self):
+        return len(self.specs)
+
+    def get(self, ext):
+        spec = self.specs.get(ext)
+        if spec is None or not isinstance(spec, tuple):
+            return spec
+        if spec not in self.loaded:
+            self.loaded[spec] = self._load(ext, *spec)
+        return self.loaded[spec]
+
+    def missing(self, ext):
+        """whether `ext' has a handler that failed to load."""
+        return ext in self.specs and self.get(ext) is None
+
+    def __getitem__(self, ext):
+        handler = self.get(ext)
+        if handler is None:
+            raise KeyError(ext)
+        return handler
+
+    def _load(self, ext, name, kwargs):
+        module_name, class_name = name.split(":")
+        try:
+            module = import_module(module_name)
+        except Exception, e:
+            logger.warn("failed to import %s, %s files are skipped: %s", module_name, ext, e)
+            return None
+        return getattr(module, class_name)(**dict(kwargs))
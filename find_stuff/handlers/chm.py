@@ -0,0 +1,34 @@
+'''
+Created on Oct 18, 2026
+
+'''
+from __future__ import absolute_import
+
+from find_stuff.chmfile import SimpleChmFile
+from find_stuff.handlers import Handler
+from find_stuff.htmltext import html_text
+
+
+class ChmHandler(Handler):
+    """
+    indexes the pages of the Content Tree, or every html object of the
+    archive with `all_objects'.
+    """
+
+    def __init__(self, all_objects=False):
+        self.all_objects = all_objects
+        # pages are deduplicated
+        self.version = "2.all" if all_objects else 2
+
+    def iter_content(self, filepath):
+        chm = SimpleChmFile(filepath, self.all_objects)
+        try:
+            # pages without a meta charset are in the encoding of the chm locale
+            encoding = chm.GetEncoding() or 'utf-8'
+            for page in chm:
+                if page is None:
+                    continue
+                yield html_text(page, encoding)
+                yield u"\n"
+        finally:
+            chm.CloseCHM()
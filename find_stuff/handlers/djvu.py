@@ -0,0 +1,45 @@
+'''
+Created on Oct 18, 2026
+
+'''
+from __future__ import absolute_import
+
+from cStringIO import StringIO
+from logging import getLogger
+
+import djvu.decode
+import djvu.sexpr
+
+from find_stuff.handlers import Handler
+
+
+logger = getLogger("indexer")
+
+#http://apt-browse.org/browse/debian/wheezy/main/i386/python-djvu/0.3.9-1/file/usr/share/doc/python-djvu/examples/djvu-dump-text
+class DjvuHandler(Handler):
+
+    def get_text(self, sexpr):
+        sio = StringIO()
+        if isinstance(sexpr, djvu.sexpr.ListExpression):
+            #print str(sexpr[0].value), [sexpr[i].value for i in xrange(1, 5)]
+            for child in sexpr[5:]:
+                sio.write(self.get_text(child))
+                sio.write(" ")
+        else:
+            sio.write(sexpr.value.strip())
+            sio.write(" ")
+        return sio.getvalue()
+
+    class Context(djvu.decode.Context):
+        def handle_message(self, message):
+            if isinstance(message, djvu.decode.ErrorMessage):
+                logger.error(message)
+
+    def iter_content(self, filepath):
+        ctx = self.Context()
+        document = ctx.new_document(djvu.decode.FileURI(filepath))
+        document.decoding_job.wait()
+        for page in document.pages:
+#             page.get_info()
+            yield self.get_text(page.text.sexpr)
+            yield "\n"
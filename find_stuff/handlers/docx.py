@@ -0,0 +1,18 @@
+'''
+Created on Oct 18, 2026
+
+'''
+from __future__ import absolute_import
+
+import docx
+
+from find_stuff.handlers import Handler
+
+
+class DocxHandler(Handler):
+
+    def iter_stream(self, fh):
+        document = docx.Document(fh)
+        for paragraph in document.paragraphs:
+            yield paragraph.text
+            yield u"\n\n"
@@ -0,0 +1,23 @@
+'''
+Created on Oct 18, 2026
+
+'''
+from __future__ import absolute_import
+
+import epub
+
+from find_stuff.handlers import Handler
+from find_stuff.htmltext import html_text
+
+
+class EpubHandler(Handler):
+
+    def iter_content(self, filepath):
+        book = epub.open_epub(filepath)
+        for item in book.opf.manifest.values():
+            # read the content
+            if item.media_type in ('application/xhtml+xml'):
+                data = book.read_item(item)
+                #yield epub.utils.get_node_text(data)
+                yield html_text(data)
+                yield u"\n"
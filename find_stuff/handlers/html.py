@@ -0,0 +1,16 @@
+'''
+Created on Oct 18, 2026
+
+'''
+from __future__ import absolute_import
+
+from functools import partial
+
+from find_stuff.handlers import Handler
+from find_stuff.htmltext import iter_html_text
+
+
+class HtmlHandler(Handler):
+
+    def iter_stream(self, fh):
+        return iter_html_text(iter(partial(fh.read, 1 << 16), b""))
@@ -0,0 +1,47 @@
+'''
+Created on Oct 18, 2026
+
+'''
+from __future__ import absolute_import
+
+from cStringIO import StringIO
+
+from pdfminer.converter import TextConverter
+from pdfminer.layout import LAParams
+from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+from pdfminer.pdfpage import PDFPage
+
+from find_stuff.handlers import Handler
+
+
+class PdfHandler(Handler):
+
+    def __init__(self):
+        self.rsrcmgr = PDFResourceManager()
+        self.laparams = LAParams(all_texts=True)
+
+    def iter_stream(self, fp):
+        outfp = StringIO()
+        device = TextConverter(self.rsrcmgr, outfp, codec="utf-8", laparams=self.laparams,
+                               imagewriter=None)
+
+        interpreter = PDFPageInterpreter(self.rsrcmgr, device)
+        try:
+            for page in PDFPage.get_pages(fp, set(),
+                                          maxpages=0, password='',
+                                          caching=True, check_extractable=False):
+                try:
+                    interpreter.process_page(page)
+                except KeyboardInterrupt:
+                    raise
+                except:
+                    pass
+                    #logger.error("error occurred.")
+
+                # hand out the text page by page
+                yield unicode(outfp.getvalue(),encoding='utf-8',errors='replace')
+                outfp.seek(0)
+                outfp.truncate()
+        finally:
+            device.close()
+            outfp.close()
@@ -0,0 +1,27 @@
+'''
+Created on Oct 18, 2026
+
+'''
+from __future__ import absolute_import
+
+from functools import partial
+import os
+
+import rarfile
+from rarfile import RarFile
+
+from find_stuff.handlers import ArchiveMember
+
+
+if os.name == 'nt':
+    rarfile.UNRAR_TOOL = 'C:\\Program Files\\WinRAR\\unrar.exe'
+
+class RarHandler(object):
+
+    def members(self, filepath):
+        with RarFile(filepath,'r') as z:
+            for info in z.infolist():
+                if info.isdir():
+                    continue
+                sig = "%08x:%d:%s" % (info.CRC, info.file_size, "-".join(map(str, info.date_time)))
+                yield ArchiveMember(info.filename, info.file_size, partial(z.open, info), sig)
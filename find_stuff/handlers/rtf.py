@@ -0,0 +1,17 @@
+'''
+Created on Oct 18, 2026
+
+'''
+from __future__ import absolute_import
+
+from pyth.plugins.plaintext.writer import PlaintextWriter
+from pyth.plugins.rtf15.reader import Rtf15Reader
+
+from find_stuff.handlers import Handler
+
+
+class RtfHandler(Handler):
+
+    def iter_stream(self, fh):
+        doc = Rtf15Reader.read(fh)
+        yield PlaintextWriter.write(doc).getvalue()
@@ -0,0 +1,124 @@
+'''
+Created on Oct 18, 2026
+
+'''
+import codecs
+import re
+
+from lxml import etree
+
+
+# elements whose text is not part of the document
+SKIPPED = frozenset(['script', 'style'])
+
+# how far into a document its encoding is looked for
+SNIFF_SIZE = 4096
+
+meta_charset_re = re.compile(r"""(<meta[^>]+charset\s*=\s*["']?\s*)([-\w.:]+)""", re.I)
+xml_encoding_re = re.compile(r"""^(\s*<\?xml[^>]+encoding\s*=\s*["'])([-\w.:]+)""", re.I)
+
+boms = [(codecs.BOM_UTF8, 'utf-8-sig'),
+        (codecs.BOM_UTF16_LE, 'utf-16'),
+        (codecs.BOM_UTF16_BE, 'utf-16')]
+
+# labels commonly used for a superset of the encoding they name
+supersets = {'gb2312': 'gb18030', 'gbk': 'gb18030', 'iso8859-1': 'cp1252', 'ascii': 'cp1252'}
+
+def sniff_encoding(head, default='utf-8'):
+    """the encoding of the html document starting with `head', from its BOM, meta tags or xml declaration."""
+    for bom, encoding in boms:
+        if head.startswith(bom):
+            return encoding
+
+    m = xml_encoding_re.search(head) or meta_charset_re.search(head)
+    if m is None:
+        return default
+    try:
+        name = codecs.lookup(m.group(2)).name
+    except LookupError:
+        return default
+    return supersets.get(name, name)
+
+class _TextTarget(object):
+    """collects the text of the parsed elements, leaving out those in SKIPPED."""
+
+    def __init__(self):
+        self.parts = []
+        self.skip = 0
+
+    def start(self, tag, attrib):
+        if tag in SKIPPED:
+            self.skip += 1
+
+    def end(self, tag):
+        if tag in SKIPPED and self.skip:
+            self.skip -= 1
+
+    def data(self, data):
+        if not self.skip:
+            self.parts.append(data)
+
+    def comment(self, text):
+        pass
+
+    def close(self):
+        pass
+
+    def take(self):
+        text = u"".join(self.parts)
+        del self.parts[:]
+        return text
+
+def declare_utf8(head):
+    # libxml2 switches to the declared encoding while parsing, even when
+    # told the encoding, so the declarations have to match what it is fed
+    head = xml_encoding_re.sub(r"\1utf-8", head)
+    return meta_charset_re.sub(r"\1utf-8", head)
+
+def iter_html_text(chunks, default='utf-8'):
+    """
+    yield the text of the html document given as chunks of bytes, as it is
+    parsed, without building a tree. the encoding is sniffed from the first
+    SNIFF_SIZE bytes, `default' is assumed if the document does not declare
+    one.
+    """
+    head = []
+    encoding = None
+    decoder = None
+    target = _TextTarget()
+    # the parser is fed utf-8 whatever the document is in, broken bytes
+    # are replaced instead of stopping the parser
+    parser = etree.HTMLParser(target=target, encoding='utf-8')
+    for chunk in chunks:
+        if isinstance(chunk, unicode):
+            chunk = chunk.encode('utf-8')
+            encoding = 'utf-8'
+        if decoder is None:
+            head.append(chunk)
+            if sum(len(c) for c in head) < SNIFF_SIZE:
+                continue
+            chunk = b"".join(head)
+            encoding = encoding or sniff_encoding(chunk[:SNIFF_SIZE], default)
+            decoder = codecs.getincrementaldecoder(encoding)('replace')
+            parser.feed(declare_utf8(decoder.decode(chunk)).encode('utf-8'))
+        else:
+            parser.feed(decoder.decode(chunk).encode('utf-8'))
+        text = target.take()
+        if text:
+            yield text
+
+    if decoder is None:
+        # shorter than SNIFF_SIZE
+        chunk = b"".join(head)
+        encoding = encoding or sniff_encoding(chunk, default)
+        decoder = codecs.getincrementaldecoder(encoding)('replace')
+        parser.feed(declare_utf8(decoder.decode(chunk)).encode('utf-8'))
+    parser.feed(decoder.decode(b"", True).encode('utf-8'))
+    parser.close()
+    text = target.take()
+    if text:
+        yield text
+
+def html_text(html, default='utf-8'):
+    """the text of the html document `html', bytes or unicode."""
+    return u"".join(iter_html_text([html], default))
@@ -4,474 +4,1394 @@ Created on Mar 21, 2016
 '''
 
 from argparse import ArgumentParser
+from collections import deque
+import cProfile
 from cStringIO import StringIO
-import codecs
-from contextlib import contextmanager
-from find_stuff.common import load_config, CJKFilter
+from contextlib import closing
+from functools import partial
+from find_stuff.cache import ExtractionCache, file_digest, data_digest
+from find_stuff.common import load_config, CJKFilter, MultiID, cjk_analyzer, set_stem_cache_size, stem_cache_info
+from find_stuff.handlers import ArchiveMember, HandlerRegistry, TxtHandler, join_chunks
+from find_stuff.maintenance import (Backfill, MergeWindow, TieredMergePolicy, index_health, log_health,
+                                    maintain, needs_merge)
+from find_stuff.manifest import Manifest, VERSION as MANIFEST_VERSION
+from find_stuff.prefilter import HEAD_SIZE, PathFilter, read_head
+from find_stuff.shards import create_shards, open_shards, shard_dirs, shard_of
+from find_stuff.stats import Progress, RunStats
+from find_stuff.watcher import watch
 import gzip
+import json
 from logging import getLogger, basicConfig
 import multiprocessing
 import os
 from os.path import exists, join, splitext
+import pstats
+import Queue
+import select
 import shutil
+import signal
+import stat
 import tarfile
 import tempfile
+import time
 from zipfile import ZipFile
 
-from whoosh.analysis.analyzers import StemmingAnalyzer
-from whoosh.fields import Schema, TEXT, ID, STORED
+from whoosh.analysis.analyzers import CompositeAnalyzer
+from whoosh.fields import Schema, TEXT, ID, NUMERIC, STORED
 from whoosh.index import create_in, open_dir
 from whoosh.util.text import rcompile
+from whoosh.writing import NO_MERGE
 
 
 logger = getLogger("indexer")
 basicConfig(level="INFO")
 
 try:
-    from rarfile import RarFile
-    import rarfile
-    
-    if os.name == 'nt':
-        rarfile.UNRAR_TOOL = 'C:\\Program Files\\WinRAR\\unrar.exe'
-        
-    rar_support = False
-except:
-    logger.warn("failed to import rarfile")
-    rar_support = True
+    import resource
+except ImportError:
+    # no address space limits on windows
+    resource = None
 
 try:
-    from bs4 import BeautifulSoup
-except:
-    logger.warn("failed to import BeautifulSoup")
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except:
+        logger.warn("failed to import scandir")
+        scandir = None
 
-try:
-    import docx
-except:
-    logger.warn("failed to import docx")
 
-try:
-    import epub
-except:
-    logger.warn("failed to import epub")
-    
-try:
-    from pdfminer.converter import TextConverter
-    from pdfminer.layout import LAParams
-    from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
-    from pdfminer.pdfpage import PDFPage
-except:
-    logger.warn("failed to import pdfminer")
+stem_ana = cjk_analyzer()
 
-try:
-    from find_stuff.chmfile import SimpleChmFile
-except:
-    logger.warn("failed to import chm packages")    
+pattern2 = rcompile(r"[A-Za-z0-9]+(\.?[A-Za-z0-9]+)*")
+stem_ana2 = cjk_analyzer(expression=pattern2)
 
-try:
-    from pyth.plugins.rtf15.reader import Rtf15Reader
-    from pyth.plugins.plaintext.writer import PlaintextWriter
-except:
-    logger.warn("failed to import rtf packages")    
 
+# mtime, filetype and topdir are columns for sorting and counting hits
+# without loading stored fields, time is kept stored for display. filetype
+# and topdir hold those of every copy of the content
+schema = Schema(title=TEXT(analyzer=stem_ana2,stored=True), content=TEXT(analyzer=stem_ana), time=STORED, path=ID(stored=True), real_path=STORED,
+                filetype=MultiID(), member_sig=STORED, digest=ID(stored=True),
+                mtime=NUMERIC(int, bits=64, sortable=True), topdir=MultiID())
+set_stem_cache_size(schema, 50000)
 
-stem_ana = StemmingAnalyzer() | CJKFilter()
-stem_ana.cachesize = -1
+def top_dir(path):
+    """the top-level directory of the indexed path `path', None at the top."""
+    if "/" not in path:
+        return None
+    return path.split("/", 1)[0]
 
-pattern2 = rcompile(r"[A-Za-z0-9]+(\.?[A-Za-z0-9]+)*")
-stem_ana2 = StemmingAnalyzer(expression=pattern2) | CJKFilter()
-stem_ana2.cachesize = -1
+def location_fields(locations):
+    """the filetype and topdir fields of a document whose copies are at `locations', [(path, real_path), ...]."""
+    return dict(filetype=sorted(set(splitext(path)[1] for path, _ in locations)),
+                topdir=sorted(set(top_dir(real_path) for _, real_path in locations) - {None}))
 
+def derived_fields(stored):
+    """the fields of an indexed document that can be told from its stored fields."""
+    return dict(location_fields([(stored['path'], stored.get('real_path') or stored['path'])]),
+                mtime=int(stored.get('time') or 0))
 
-schema = Schema(title=TEXT(analyzer=stem_ana2,stored=True), content=TEXT(analyzer=stem_ana), time=STORED, path=ID(stored=True), real_path=STORED, filetype=ID)
+def upgrade_schema(ix, stem_cache_size=50000):
+    # add fields introduced after the index was created and size the
+    # stemming caches, the writer processes get both from the stored schema
+    missing = [name for name in schema.names() if name not in ix.schema]
+    # fields that gained a column or whose column changed type, documents
+    # indexed before are rewritten with the values derived from their
+    # stored fields
+    columns = [name for name in schema.names() if schema[name].column_type is not None and
+               (name in missing or type(ix.schema[name].column_type) is not type(schema[name].column_type))]
+    # analyzers splitting CJK runs after stemming, the mixed tokens of the
+    # documents indexed since get the same terms as plain words
+    stale = [name for name in schema.names() if name in ix.schema and
+             isinstance(getattr(ix.schema[name], 'analyzer', None), CompositeAnalyzer) and
+             isinstance(ix.schema[name].analyzer.items[-1], CJKFilter)]
+    if missing or columns or stale or set_stem_cache_size(ix.schema, stem_cache_size):
+        writer = ix.writer()
+        for name in missing:
+            logger.info("adding field %s to index", name)
+            writer.add_field(name, schema[name])
+        for name in stale:
+            logger.info("splitting CJK runs before stemming in field %s", name)
+            field = writer.schema[name]
+            field.analyzer = cjk_analyzer(field.analyzer.items[0].expression)
+        for name in columns:
+            if name not in missing:
+                logger.info("replacing the column of field %s", name)
+                writer.remove_field(name)
+                writer.add_field(name, schema[name])
+        if set_stem_cache_size(writer.schema, stem_cache_size):
+            logger.info("stemming cache size set to %d", stem_cache_size)
+        docs = writer.reader().doc_count()
+        if columns and docs:
+            start = time.time()
+            writer.commit(mergetype=Backfill(columns, derived_fields))
+            logger.info("filled %s of %d documents in %.1fs", ", ".join(columns), docs, time.time() - start)
+        else:
+            writer.commit()
 
-handlers = {}
+class ZipHandler(object):
+    
+    def members(self, filepath):
+        with ZipFile(filepath,'r') as z:
+            for info in z.infolist():
+                if info.filename.endswith('/'):
+                    continue
+                sig = "%08x:%d:%s" % (info.CRC, info.file_size, "-".join(map(str, info.date_time)))
+                yield ArchiveMember(info.filename, info.file_size, partial(z.open, info), sig)
 
-class TxtHandler(object):
+class TarHandler(object):
     
-    def extract_content(self, filepath):
-        with codecs.open(filepath, encoding='utf-8') as fh:
-            return fh.read()
+    def members(self, filepath):
+        # stream mode, members are read sequentially without seeking back
+        with tarfile.open(filepath,'r|*') as z:
+            for info in z:
+                if not info.isfile():
+                    continue
+                sig = "%08x:%d:%d" % (info.chksum, info.size, info.mtime)
+                yield ArchiveMember(info.name, info.size, partial(z.extractfile, info), sig)
 
+class GzipHandler(object):
+    
+    def members(self, filepath):
+        bn, _ = os.path.splitext(os.path.basename(filepath))
+        yield ArchiveMember(bn, None, partial(gzip.open, filepath, 'rb'))
 
-def to_utf8(v):
-    if type(v) == str:
-        return unicode(v, encoding='utf-8',errors='replace')
-    return v
+handlers = HandlerRegistry()
+handlers[".txt"] = TxtHandler()
+handlers.register(".pdf", "find_stuff.handlers.pdf:PdfHandler")
+handlers.register(".epub", "find_stuff.handlers.epub:EpubHandler")
+handlers.register(".html", "find_stuff.handlers.html:HtmlHandler")
+handlers.register(".htm", "find_stuff.handlers.html:HtmlHandler")
+handlers.register(".chm", "find_stuff.handlers.chm:ChmHandler")
+handlers.register(".docx", "find_stuff.handlers.docx:DocxHandler")
+handlers.register(".rtf", "find_stuff.handlers.rtf:RtfHandler")
+handlers.register(".djvu", "find_stuff.handlers.djvu:DjvuHandler")
 
-#http://stackoverflow.com/questions/22799990/beatifulsoup4-get-text-still-has-javascript
-def extract_html(html):
-    soup = BeautifulSoup(html,"lxml")
-    
-    # kill all script and styl elements
-    for script in soup(["script", "style"]):
-        script.extract()    # rip it out
+archive_handlers = HandlerRegistry()
+archive_handlers[".zip"] = ZipHandler()
+archive_handlers[".tar"] = TarHandler()
+archive_handlers[".tar.gz"] = TarHandler()
+archive_handlers[".gz"] = GzipHandler()
+archive_handlers.register(".rar", "find_stuff.handlers.rar:RarHandler")
+
+def os_path(p):
+    if os.name == 'nt':
+        return p.replace('/',os.path.sep)
+    else:
+        return p
+
+def std_path(p):
+    if os.name == 'nt':
+        return p.replace(os.path.sep, '/')
+    return p    
+
+def path_join(path, *args):
+    return os.path.join(path, *args)
     
-    # get text
-    text = soup.get_text()
+
+def get_handler(ext):
+    return handlers.get(ext)
+
+def splitext(f):
+    filename, ext = os.path.splitext(f)
+    if ext == '.gz':
+        _, ext2 = splitext(filename)
+        if ext2 == '.tar':
+            ext = '.tar.gz'
     
-    return text
+    return filename,ext
 
-class RtfHandler(object):
+def read_member(member, ext, spill_threshold, check=None):
+    """
+    returns (data, None, None) for members small enough to be handed to
+    the handler's iter_stream, or (None, tmp_path, None) of a spilled copy.
+    members without a handler are read all the same, their digest tells
+    them apart. `check' is given the first bytes of the member, if it
+    tells why the member is left out (None, None, reason) is returned
+    without reading further.
+    """
+    hdr = get_handler(ext)
     
-    def extract_content(self, filepath):
-        with open(filepath, "rb") as fh:
-            doc = Rtf15Reader.read(fh)
+    with closing(member.open()) as fh:
+        data = ""
+        if check is not None:
+            data = fh.read(HEAD_SIZE)
+            reason = check(data)
+            if reason is not None:
+                return None, None, reason
+        if (hdr is None or hasattr(hdr, 'iter_stream')) and (member.size is None or member.size <= spill_threshold):
+            data += fh.read(spill_threshold + 1 - len(data))
+            if len(data) <= spill_threshold:
+                return data, None, None
         
-        return to_utf8(PlaintextWriter.write(doc).getvalue())
-
-class DocxHandler(object):
-    
-    def extract_content(self, filepath):
-        document = docx.Document(filepath)
-        docText = '\n\n'.join([
-            paragraph.text.encode('utf-8') for paragraph in document.paragraphs
-        ])
-        return to_utf8(docText)
-
-class HtmlHandler(object):
-    
-    def extract_content(self, filepath):
-        with codecs.open(filepath, encoding='utf-8') as fh:
-            return extract_html(fh.read())
-
-class EpubHandler(object):
-    
-    def extract_content(self, filepath):
-        book = epub.open_epub(filepath)
-        sio = StringIO()
-        for item in book.opf.manifest.values():
-            # read the content
-            if item.media_type in ('application/xhtml+xml'):
-                data = book.read_item(item)
-                #sio.write(epub.utils.get_node_text(data))
-                sio.write(extract_html(data).encode('utf-8'))
-                sio.write("\n")
-        return to_utf8(sio.getvalue())
-    
-class ChmHandler(object):
-    
-    def extract_content(self, filepath):
-        chm = SimpleChmFile(filepath)
-        sio = StringIO()
-        for page in chm:
-            if page is None:
+        fd, tmppath = tempfile.mkstemp(suffix=ext)
+        with os.fdopen(fd, 'wb') as out:
+            out.write(data)
+            shutil.copyfileobj(fh, out)
+        return None, tmppath, None
+
+def get_paths(work_path, prefilter=None, stats=None):
+    """
+    yields (path, stat) of all files under work_path, symlinked
+    directories are not followed. the files and directories the PathFilter
+    `prefilter' prunes are skipped, and counted in `stats'.
+    """
+    def pruned(name, filepath):
+        if prefilter is None or not prefilter.prune(name, filepath):
+            return False
+        if stats is not None:
+            stats.count("skipped excluded")
+        return True
+    
+    if scandir is None:
+        for root, dirnames, files in os.walk(work_path):
+            dirnames[:] = [d for d in dirnames if not pruned(d, path_join(root, d))]
+            for f in files:
+                filepath = path_join(root, f)
+                if pruned(f, filepath):
+                    continue
+                try:
+                    yield filepath, os.stat(filepath)
+                except OSError:
+                    pass
+        return
+    
+    dirs = [work_path]
+    while dirs:
+        try:
+            entries = scandir(dirs.pop())
+        except OSError:
+            logger.exception("error occurred")
+            continue
+        for entry in entries:
+            if pruned(entry.name, entry.path):
                 continue
-            sio.write(extract_html(page).encode('utf-8'))
-            sio.write("\n")
-        return to_utf8(sio.getvalue())
-        
-try:
-    import djvu.decode
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.path)
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue
+            if stat.S_ISREG(st.st_mode):
+                yield entry.path, st
+
+def get_changed_paths(paths, removed, prefilter=None, stats=None):
+    """
+    yields (path, stat) of the files at or under `paths', the paths that
+    no longer exist are appended to `removed'.
+    """
+    for p in paths:
+        if prefilter is not None and prefilter.excluded(std_path(os.path.relpath(p, prefilter.root))):
+            if stats is not None:
+                stats.count("skipped excluded")
+            continue
+        try:
+            st = os.stat(p)
+        except OSError:
+            removed.append(p)
+            continue
+        if stat.S_ISDIR(st.st_mode):
+            for item in get_paths(p, prefilter, stats):
+                yield item
+        elif stat.S_ISREG(st.st_mode):
+            yield p, st
+
+def _init_worker():
+    # let the parent handle ctrl-c
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+class Extractor(object):
+    """
+    extracts contents with the registered handlers, consulting the
+    extraction cache first if there is one. with `cache_only', cache misses
+    are skipped instead of being handed to the handlers. contents are
+    truncated to `limit' characters.
+    """
+    
+    def __init__(self, cache=None, cache_only=False, limit=0):
+        self.cache = cache
+        self.cache_only = cache_only
+        self.limit = limit
     
-    #http://apt-browse.org/browse/debian/wheezy/main/i386/python-djvu/0.3.9-1/file/usr/share/doc/python-djvu/examples/djvu-dump-text
-    class DjvuHandler(object):
+    def extract(self, name, ext, real_path=None, data=None, digest=None):
+        hdr = get_handler(ext)
+        if hdr is None:
+            # indexed by title only
+            return u""
         
-        def get_text(self, sexpr):
-            sio = StringIO()
-            if isinstance(sexpr, djvu.sexpr.ListExpression):
-                #print str(sexpr[0].value), [sexpr[i].value for i in xrange(1, 5)]
-                for child in sexpr[5:]:
-                    sio.write(self.get_text(child))
-                    sio.write(" ")
-            else:
-                sio.write(sexpr.value.strip())
-                sio.write(" ")
-            return sio.getvalue()
-    
-        class Context(djvu.decode.Context):
-            def handle_message(self, message):
-                if isinstance(message, djvu.decode.ErrorMessage):
-                    logger.error(message)
+        if self.cache is None:
+            return self._extract(hdr, real_path, data)
         
-        def extract_content(self, filepath):
-            ctx = self.Context()
-            document = ctx.new_document(djvu.decode.FileURI(filepath))
-            document.decoding_job.wait()
-            sio = StringIO()
-            for page in document.pages:
-    #             page.get_info()
-                sio.write(self.get_text(page.text.sexpr))
-                sio.write("\n")
-            
-            txt = sio.getvalue()
-            return to_utf8(txt)
-
-    handlers[".djvu"] = DjvuHandler()
+        if digest is None:
+            digest = content_digest(real_path, data)
+        key = self.cache.key(digest, hdr, self.limit)
+        content = self.cache.get(key)
+        if content is None:
+            if self.cache_only:
+                logger.info("not in cache: %s", name)
+                return None
+            content = self._extract(hdr, real_path, data)
+            self.cache.put(key, content)
+        return content
+    
+    def _extract(self, hdr, real_path, data):
+        if data is None:
+            return hdr.extract_content(real_path.encode('utf-8'), self.limit)
+        return join_chunks(hdr.iter_stream(StringIO(data)), self.limit)
 
-except:
-    logger.warn("failed to initialize djvu handler")
+def content_digest(real_path=None, data=None):
+    if data is None:
+        digest = file_digest(real_path.encode('utf-8'))
+    else:
+        digest = data_digest(data)
+    # stored in the index
+    return unicode(digest)
 
+def extract_job(job):
+    """
+    returns (content, seconds, failure), content is None if extraction
+    failed, failure is "memory" if it ran out of memory.
+    """
+    extractor, name, ext, real_path, data, temp, digest = job
+    start = time.time()
+    content = None
+    failure = None
+    try:
+        content = extractor.extract(name, ext, real_path, data, digest)
+    except KeyboardInterrupt:
+        raise
+    except MemoryError:
+        logger.error("out of memory while extracting %s", name)
+        failure = "memory"
+    except:
+        logger.exception("error occurred while extracting %s", name)
+    finally:
+        if temp:
+            os.remove(real_path)
+    return content, time.time() - start, failure
 
-class PdfHandler(object):
-    
-    def __init__(self):
-        self.rsrcmgr = PDFResourceManager()
-        self.laparams = LAParams(all_texts=True)
+def _extraction_worker(conn, memory_limit):
+    _init_worker()
+    if memory_limit and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    for job in iter(conn.recv, None):
+        conn.send(extract_job(job))
 
-    def extract_content(self, filepath):
-        outfp = StringIO()
-        device = TextConverter(self.rsrcmgr, outfp, codec="utf-8", laparams=self.laparams,
-                               imagewriter=None)
+def wait_readable(conns, timeout):
+    """return the connections of `conns' that can be read within `timeout' seconds."""
+    if os.name == 'nt':
+        # select only works on sockets there
+        deadline = time.time() + timeout
+        while True:
+            ready = [conn for conn in conns if conn.poll()]
+            if ready or time.time() >= deadline:
+                return ready
+            time.sleep(0.01)
+    return select.select(conns, [], [], timeout)[0]
 
-        with open(filepath, 'rb') as fp:
-            interpreter = PDFPageInterpreter(self.rsrcmgr, device)
-            try:
-                for page in PDFPage.get_pages(fp, set(),
-                                              maxpages=0, password='',
-                                              caching=True, check_extractable=False):
-                    try:
-                        interpreter.process_page(page)
-                    except KeyboardInterrupt:
-                        raise
-                    except:
-                        pass
-                        #logger.error("error occurred.")
-            finally:
-                device.close()
-                txt= unicode(outfp.getvalue(),encoding='utf-8')
-                outfp.close()
-        return to_utf8(txt)
-    
-    
-
-htmlhdr = HtmlHandler()
-txthdr = TxtHandler()
-handlers[".txt"] = txthdr
-handlers[".pdf"] = PdfHandler()
-handlers[".epub"] = EpubHandler()
-handlers[".html"] = htmlhdr
-handlers[".htm"] = htmlhdr
-handlers[".chm"] = ChmHandler()
-handlers[".docx"] = DocxHandler()
-handlers[".rtf"] = RtfHandler()
+class ExtractionTask(object):
+    
+    def __init__(self, job):
+        self.job = job
+        self.result = None
 
-class ZipHandler(object):
+class ExtractionWorker(object):
+    """a process running one extraction at a time, it can be killed without harming the others."""
     
-    @contextmanager            
-    def extract(self, filepath):
-        try:
-            tmp_dir = tempfile.mkdtemp()
-            with ZipFile(filepath,'r') as z:
-                tmppath = join(tmp_dir,os.path.basename(filepath))
-                os.makedirs(tmppath)
-                z.extractall(tmppath)
-                
-            yield tmppath
-        finally:
-            shutil.rmtree(tmp_dir)
-            
-    def path_exists(self, archive, path):
-        with ZipFile(archive,'r') as z:
-            return path in z.namelist()
+    def __init__(self, memory_limit=0):
+        self.conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_extraction_worker, args=(child, memory_limit))
+        self.process.daemon = True
+        self.process.start()
+        child.close()
+        self.task = None
+        self.started = None
+    
+    def start(self, task):
+        self.task = task
+        self.started = time.time()
+        self.conn.send(task.job)
+    
+    def stop(self, kill=False):
+        if kill:
+            self.process.terminate()
+        else:
+            self.conn.send(None)
+        self.process.join()
+        self.conn.close()
 
-class RarHandler(object):
+class ExtractionPool(object):
+    """
+    runs handlers in `jobs' worker processes and hands finished contents to
+    `consume(record, content, seconds, failure)' in submission order. at
+    most `queue_size' extractions are in flight, so memory stays bounded.
     
-    @contextmanager            
-    def extract(self, filepath):
-        try:
-            tmp_dir = tempfile.mkdtemp()
-            with RarFile(filepath,'r') as z:
-                tmppath = join(tmp_dir,os.path.basename(filepath))
-                os.makedirs(tmppath)
-                z.extractall(tmppath)
-                
-            yield tmppath
-        finally:
-            shutil.rmtree(tmp_dir)
-            
-    def path_exists(self, archive, path):
-        with RarFile(archive,'r') as z:
-            return path in z.namelist()
-        
-class TarHandler(object):
+    a worker spending more than `timeout' seconds on a file is killed and
+    replaced, workers are limited to `memory_limit' bytes of address space;
+    `failure' is then "timeout", "crash" or "memory". with a single job and
+    no limits, extraction happens in this process.
+    """
     
-    @contextmanager            
-    def extract(self, filepath):
-        try:
-            tmp_dir = tempfile.mkdtemp()
-            with tarfile.open(filepath,'r') as z:
-                tmppath = join(tmp_dir,os.path.basename(filepath))
-                os.makedirs(tmppath)
-                z.extractall(tmppath)
-                
-            yield tmppath
-        finally:
-            shutil.rmtree(tmp_dir)
-            
-    def path_exists(self, archive, path):
-        with tarfile.open(archive,'r') as z:
-            return path in z.getnames()
+    def __init__(self, consume, extractor, jobs=1, queue_size=None, stats=None, timeout=0, memory_limit=0):
+        self.consume = consume
+        self.extractor = extractor
+        self.stats = stats or RunStats()
+        self.queue_size = queue_size or jobs * 2
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.pending = deque()
+        self.waiting = deque()
+        self.workers = []
+        if jobs > 1 or timeout or memory_limit:
+            self.workers = [ExtractionWorker(memory_limit) for _ in range(jobs)]
+    
+    def submit(self, record, name, ext, real_path=None, data=None, temp=False, digest=None):
+        job = (self.extractor, name, ext, real_path, data, temp, digest)
+        if not self.workers:
+            self.consume(record, *extract_job(job))
+            return
         
-class GzipHandler(object):
+        task = ExtractionTask(job)
+        self.pending.append((record, task))
+        self.waiting.append(task)
+        self._dispatch()
+        while len(self.pending) >= self.queue_size:
+            self._complete()
     
-    @contextmanager            
-    def extract(self, filepath):
-        try:
-            tmp_dir = tempfile.mkdtemp()
-            with gzip.open(filepath,'rb') as z:
-                tmppath = join(tmp_dir,os.path.basename(filepath))
-                os.makedirs(tmppath)
-                #z.extractall(tmppath)
-                bn, _ = os.path.splitext(os.path.basename(filepath))
-                with open(join(tmppath,bn),'wb') as f:
-                    f.write(z.read())
-                
-            yield tmppath
-        finally:
-            shutil.rmtree(tmp_dir)
+    def then(self, callback):
+        """call `callback' once everything submitted so far has been consumed."""
+        if not self.workers:
+            callback()
+        else:
+            self.pending.append((callback, None))
+    
+    def _dispatch(self):
+        for worker in self.workers:
+            if not self.waiting:
+                break
+            if worker.task is None:
+                worker.start(self.waiting.popleft())
+    
+    def _poll(self):
+        busy = [worker for worker in self.workers if worker.task is not None]
+        wait = 1.0
+        if self.timeout and busy:
+            wait = max(0, min(wait, min(worker.started for worker in busy) + self.timeout - time.time()))
+        ready = wait_readable([worker.conn for worker in busy], wait)
+        
+        for i, worker in enumerate(self.workers):
+            task = worker.task
+            if task is None:
+                continue
+            elapsed = time.time() - worker.started
+            if worker.conn in ready:
+                try:
+                    task.result = worker.conn.recv()
+                    worker.task = None
+                    continue
+                except EOFError:
+                    failure = "crash"
+            elif self.timeout and elapsed > self.timeout:
+                failure = "timeout"
+            else:
+                continue
             
-    def path_exists(self, archive, path):
-        return path + ".gz" == archive
+            _, name, _, real_path, _, temp, _ = task.job
+            logger.error("extraction of %s failed after %.1fs: %s", name, elapsed, failure)
+            task.result = (None, elapsed, failure)
+            worker.stop(kill=True)
+            if temp and exists(real_path):
+                os.remove(real_path)
+            self.workers[i] = ExtractionWorker(self.memory_limit)
         
+        self._dispatch()
+    
+    def _complete(self):
+        record, task = self.pending.popleft()
+        if task is None:
+            record()
+            return
+        with self.stats.timer("extraction wait"):
+            while task.result is None:
+                self._poll()
+        self.consume(record, *task.result)
+    
+    def drain(self):
+        while self.pending:
+            self._complete()
+    
+    def close(self):
+        self.drain()
+        for worker in self.workers:
+            worker.stop()
+    
+    def terminate(self):
+        self.pending.clear()
+        self.waiting.clear()
+        for worker in self.workers:
+            worker.stop(kill=True)
 
-archive_handlers = {
-                    ".zip": ZipHandler(),
-                    ".tar": TarHandler(),
-                    ".tar.gz": TarHandler(),
-                    ".gz": GzipHandler(),
-                    }
+class CommitPolicy(object):
+    """
+    commit once `docs' documents, `mb' megabytes of content or `seconds'
+    seconds have accumulated since the last commit, whichever comes first.
+    a limit of 0 disables it. segments are merged by `merge_policy', a
+    whoosh merge policy, whoosh's own if None; with `defer_merge' only by
+    the final commit of a run.
+    """
+    
+    def __init__(self, docs=1000, mb=64, seconds=300, defer_merge=False, merge_policy=None):
+        self.docs = docs
+        self.bytes = mb * 1024 * 1024
+        self.seconds = seconds
+        self.defer_merge = defer_merge
+        self.merge_policy = merge_policy
+    
+    def due(self, count, size, elapsed):
+        return ((self.docs and count >= self.docs) or
+                (self.bytes and size >= self.bytes) or
+                (self.seconds and elapsed >= self.seconds))
 
-if rar_support:
-    archive_handlers[".rar"] = RarHandler()
+MIN_LIMITMB = 32
 
-def os_path(p):
-    if os.name == 'nt':
-        return p.replace('/',os.path.sep)
-    else:
-        return p
+class MemoryBudget(object):
+    """
+    sizes the processes of a run to fit in `mb' megabytes. every process is
+    charged `process_mb' (interpreter, handlers, stemming caches),
+    extraction workers `worker_mb' more for the document in flight, and
+    the writer processes share what is left as whoosh's limitmb.
+    extraction gets at most half of the budget. without a budget, writers
+    use a process per cpu and a limitmb of 512 between them.
+    """
+    
+    def __init__(self, mb=0, worker_mb=256, process_mb=64):
+        self.mb = mb
+        self.worker_mb = worker_mb
+        self.process_mb = process_mb
+    
+    def plan(self, jobs, writers=1):
+        """return (jobs, procs, limitmb): extraction jobs and the processes and limitmb of each of `writers' writers."""
+        procs = max(1, multiprocessing.cpu_count() // writers)
+        if not self.mb:
+            return jobs, procs, max(64, 512 // writers)
+        
+        jobs = max(1, min(jobs, self.mb // 2 // (self.process_mb + self.worker_mb)))
+        left = self.mb - self.process_mb - jobs * (self.process_mb + self.worker_mb)
+        procs = max(1, min(procs, left // writers // (self.process_mb + MIN_LIMITMB)))
+        limitmb = max(MIN_LIMITMB, left // (writers * procs) - self.process_mb)
+        return jobs, procs, limitmb
 
-def std_path(p):
-    if os.name == 'nt':
-        return p.replace(os.path.sep, '/')
-    return p    
+def segment_count(ix):
+    if isinstance(ix, list):
+        return sum(segment_count(shard) for shard in ix)
+    return len(ix._segments())
 
-def path_join(path, *args):
-    return os.path.join(path, *args)
+class BatchWriter(object):
+    """
+    wraps a whoosh writer of `procs' processes, committing according to a
+    CommitPolicy. whoosh leaves a writer unusable once adding a document
+    failed, so it is cancelled and replaced: the deletions since the last
+    commit are done again, the documents added since are dropped and
+    passed to `on_failed(path)'.
+    """
+    
+    def __init__(self, ix, policy=None, on_commit=None, stats=None, procs=None, limitmb=512, on_failed=None):
+        self.ix = ix
+        self.policy = policy or CommitPolicy()
+        self.procs = procs or multiprocessing.cpu_count()
+        self.limitmb = limitmb
+        self.on_commit = on_commit
+        self.on_failed = on_failed
+        self.stats = stats or RunStats()
+        self.count = 0
+        self.size = 0
+        self.dirty = False
+        # paths added and terms deleted since the last commit
+        self.added = []
+        self.deleted = []
+        self.commits = 0
+        self.total = 0
+        self.segments = segment_count(ix)
+        self.writer = self._new_writer()
     
+    def _new_writer(self):
+        self.started = time.time()
+        return self.ix.writer(limitmb=self.limitmb, procs=self.procs)
     
-def path_exists(path):
-    return os.path.exists(path)
+    def delete_by_term(self, fieldname, text):
+        self.writer.delete_by_term(fieldname, text)
+        self.deleted.append((fieldname, text))
+        self.dirty = True
     
-def getmtime(path):
-    if path_exists(path):
-        mtime = os.path.getmtime(path)
-        return mtime
-    raise IOError, "path %s does not exists" % path
+    def add_document(self, **fields):
+        with self.stats.timer("add_document"):
+            try:
+                self.writer.add_document(**fields)
+            except:
+                self._reset()
+                raise
+        self.added.append(fields['path'])
+        self.count += 1
+        self.size += len(fields.get('content') or "")
+        self.dirty = True
         
+        if self.policy.due(self.count, self.size, time.time() - self.started):
+            self.commit(merge=not self.policy.defer_merge)
+            self.writer = self._new_writer()
+    
+    def flush(self):
+        """commit the documents added since the last commit, whoosh's deletions only see committed ones."""
+        if self.added:
+            self.commit(merge=False)
+            self.writer = self._new_writer()
+    
+    def _reset(self):
+        self.writer.cancel()
+        self.writer = self._new_writer()
+        for fieldname, text in self.deleted:
+            self.writer.delete_by_term(fieldname, text)
+        if self.added:
+            logger.error("dropped the %d documents added since the last commit", len(self.added))
+            self.stats.count("dropped", len(self.added))
+            if self.on_failed is not None:
+                for path in self.added:
+                    self.on_failed(path)
+        self.added = []
+        self.count = 0
+        self.size = 0
+        self.dirty = bool(self.deleted)
+    
+    def _stem_cache_info(self):
+        # with procs > 1 whoosh analyzes in subprocesses, their caches can't be read
+        if self.procs > 1:
+            return None
+        return stem_cache_info(self.writer.schema)
+    
+    def commit(self, merge=True):
+        if self.dirty:
+            stem_cache = self._stem_cache_info()
+            if stem_cache is None:
+                self.stats.stem_cache_unavailable(self.procs)
+            else:
+                self.stats.add_stem_cache(*stem_cache)
+            start = time.time()
+            self.writer.commit(mergetype=self.policy.merge_policy if merge else NO_MERGE)
+            self.stats.add_commit(time.time() - start)
+            self.commits += 1
+            self.total += self.count
+            if self.count > 0:
+                logger.info("indexed %d files", self.count)
+        else:
+            self.writer.cancel()
+        if self.on_commit is not None:
+            self.on_commit()
+        self.count = 0
+        self.size = 0
+        self.dirty = False
+        self.added = []
+        self.deleted = []
+    
+    def close(self):
+        self.commit()
+        segments = segment_count(self.ix)
+        logger.info("indexed %d files in %d commits, segments %d -> %d",
+                    self.total, self.commits, self.segments, segments)
 
-def get_handler(ext):
-    return handlers.get(ext)
-
-def splitext(f):
-    filename, ext = os.path.splitext(f)
-    if ext == '.gz':
-        _, ext2 = splitext(filename)
-        if ext2 == '.tar':
-            ext = '.tar.gz'
+def _shard_writer(index_dir, limitmb, procs, inbox, outbox):
+    """
+    the process writing one shard, see ShardWriters. every commit or cancel
+    is acknowledged with (paths that failed to be added, error, stemming
+    cache (hits, misses), None if the writer analyzes in subprocesses).
+    paths are passed as (path, rejected), `rejected' telling the document
+    whose add failed from those dropped with it: once adding a document
+    failed, the writer is replaced as BatchWriter does, dropping the
+    documents added since the last commit.
+    """
+    _init_worker()
+    ix = open_dir(index_dir)
+    writer = None
+    failed = []
+    added = []
+    deleted = []
+    for op, arg in iter(inbox.get, None):
+        if op in ("add", "delete") and writer is None:
+            writer = ix.writer(limitmb=limitmb, procs=procs)
+        
+        if op == "add":
+            try:
+                writer.add_document(**arg)
+                added.append(arg['path'])
+            except:
+                logger.exception("error occurred")
+                writer.cancel()
+                writer = ix.writer(limitmb=limitmb, procs=procs)
+                for term in deleted:
+                    writer.delete_by_term(*term)
+                failed.extend((path, False) for path in added)
+                failed.append((arg['path'], True))
+                added = []
+        elif op == "delete":
+            writer.delete_by_term(*arg)
+            deleted.append(arg)
+        else:
+            error = None
+            stem_cache = (0, 0)
+            if writer is not None:
+                stem_cache = stem_cache_info(writer.schema) if procs == 1 else None
+                try:
+                    if op == "commit":
+                        writer.commit(mergetype=arg)
+                    else:
+                        writer.cancel()
+                except Exception, e:
+                    logger.exception("error occurred")
+                    error = "%s: %s" % (index_dir, e)
+                writer = None
+            outbox.put((failed, error, stem_cache))
+            failed = []
+            added = []
+            deleted = []
     
-    return filename,ext
+    if writer is not None:
+        writer.cancel()
 
-def get_paths(work_path, indexed_paths, to_index, target_path):
-    for root, _, files in os.walk(work_path):
-        for f in files:
-            _, ext = splitext(f)
-            if ext in archive_handlers:
-                archive_path = path_join(root, f)
-                relpath = os.path.relpath(archive_path, target_path)
-                if relpath not in indexed_paths or relpath in to_index:
-                     
-                    with archive_handlers[ext].extract(archive_path) as realroot:
-                        for root2, _, files2 in os.walk(realroot):
-                            for f in files2:
-                                
-                                real_path = path_join(root2, f)
-                                index_path = path_join(relpath, os.path.relpath(real_path, realroot))
-                                
-                                yield real_path, index_path, relpath
+class ShardWriters(object):
+    """
+    looks like a whoosh writer over a list of shards. each shard is written
+    by its own process, documents and deletions by path go to the shard of
+    the path; commits are done by all shards in parallel. documents the
+    shard failed to add are passed to `on_failed(path, rejected)' on
+    commit, see _shard_writer.
+    """
+    
+    def __init__(self, shards, on_failed=None, stats=None, procs=1, limitmb=64, queue_size=16):
+        self.on_failed = on_failed
+        self.stats = stats or RunStats()
+        self.procs = procs
+        self.inboxes = []
+        self.processes = []
+        self.outbox = multiprocessing.Queue()
+        for shard in shards:
+            inbox = multiprocessing.Queue(queue_size)
+            process = multiprocessing.Process(target=_shard_writer,
+                                              args=(shard.storage.folder, limitmb, procs, inbox, self.outbox))
+            process.start()
+            self.inboxes.append(inbox)
+            self.processes.append(process)
+    
+    def _put(self, i, message):
+        # don't block forever on a shard writer that died
+        while True:
+            try:
+                self.inboxes[i].put(message, timeout=1)
+                return
+            except Queue.Full:
+                if not self.processes[i].is_alive():
+                    raise RuntimeError("shard writer %d exited with %s" % (i, self.processes[i].exitcode))
+    
+    def add_document(self, **fields):
+        self._put(shard_of(fields['path'], len(self.inboxes)), ("add", fields))
+    
+    def delete_by_term(self, fieldname, text):
+        if fieldname == 'path':
+            self._put(shard_of(text, len(self.inboxes)), ("delete", (fieldname, text)))
+        else:
+            for i in range(len(self.inboxes)):
+                self._put(i, ("delete", (fieldname, text)))
+    
+    def _broadcast(self, op, arg):
+        for i in range(len(self.inboxes)):
+            self._put(i, (op, arg))
+        
+        errors = []
+        for _ in self.inboxes:
+            while True:
+                try:
+                    failed, error, stem_cache = self.outbox.get(timeout=1)
+                    break
+                except Queue.Empty:
+                    for i, process in enumerate(self.processes):
+                        if not process.is_alive():
+                            raise RuntimeError("shard writer %d exited with %s" % (i, process.exitcode))
+            if self.on_failed is not None:
+                for path, rejected in failed:
+                    self.on_failed(path, rejected)
+            if error is not None:
+                errors.append(error)
+            if stem_cache is None:
+                self.stats.stem_cache_unavailable(self.procs * len(self.inboxes))
             else:
-                real_path = path_join(root, f)
-                index_path = os.path.relpath(real_path, target_path)
-                yield real_path, index_path, index_path
+                self.stats.add_stem_cache(*stem_cache)
+        if errors:
+            raise RuntimeError("failed to %s shards: %s" % (op, "; ".join(errors)))
+    
+    def commit(self, mergetype=None):
+        self._broadcast("commit", mergetype)
+    
+    def cancel(self):
+        self._broadcast("cancel", None)
+    
+    def close(self):
+        for inbox, process in zip(self.inboxes, self.processes):
+            if process.is_alive():
+                inbox.put(None)
+        for process in self.processes:
+            process.join()
 
-# https://whoosh.readthedocs.org/en/latest/indexing.html#incremental-indexing
-def incremental_index(ix, target_path, indexables, work_path):
-    # The set of all paths in the index
-    indexed_paths = set()
-    # The set of all paths we need to re-index
-    to_index = set()
+class ShardedWriter(BatchWriter):
+    """
+    BatchWriter over a list of shards, see ShardWriters. the commit policy
+    applies to all shards together, so the manifest is only committed
+    once every shard has committed.
+    """
+    
+    def __init__(self, shards, policy=None, on_commit=None, stats=None, on_failed=None, procs=1, limitmb=64):
+        self.shard_writers = ShardWriters(shards, on_failed, stats, procs, limitmb)
+        BatchWriter.__init__(self, shards, policy, on_commit, stats, procs, limitmb)
+    
+    def _new_writer(self):
+        self.started = time.time()
+        return self.shard_writers
+    
+    def _reset(self):
+        # adds only fail in the shard writers, which replace their writers
+        pass
+    
+    def _stem_cache_info(self):
+        # the shard writers report theirs when they commit
+        return 0, 0
+    
+    def close(self):
+        try:
+            BatchWriter.close(self)
+        finally:
+            self.shard_writers.close()
 
-    with ix.searcher() as searcher:
-        writer = ix.writer(limitmb=512, procs=multiprocessing.cpu_count())
+def file_state(st):
+    return st.st_size, st.st_mtime, st.st_ino or None
 
-        # Loop over the stored fields in the index
+def file_changed(state, st):
+    if state is None:
+        return True
+    size, mtime, inode = state
+    return (mtime != st.st_mtime or
+            (size is not None and size != st.st_size) or
+            (inode is not None and inode != (st.st_ino or None)))
+
+def bootstrap_manifest(ix, manifest):
+    # indexes created before the manifest existed, sizes and inodes are
+    # unknown until the files change
+    with ix.searcher() as searcher:
         for fields in searcher.all_stored_fields():
             indexed_path = fields['path']
             real_path = fields['real_path']
+            indexed_time = fields['time']
+            manifest.names.add(indexed_path)
+            if indexed_path != real_path:
+                manifest.set_member(indexed_path, real_path, fields.get('member_sig'))
+            if fields.get('digest'):
+                manifest.set_location(indexed_path, fields['digest'], real_path)
+            state = manifest.get_file(real_path)
+            if state is None or state[1] < indexed_time:
+                manifest.set_file(real_path, None, indexed_time, None)
+    manifest.set_version()
+    manifest.commit()
 
-            indexed_paths.add(os_path(real_path))
-            
-            filepath = path_join(target_path, real_path)
-            #if not os.path.exists(filepath):
-            if not path_exists(filepath):
-                # This file was deleted since it was indexed
-                logger.info("remove: %s", indexed_path)
-                writer.delete_by_term('path', indexed_path)
-            
-            else:
-                # Check if this file was changed since it
-                # was indexed
-                indexed_time = fields['time']
-                mtime = getmtime(filepath)
-                if mtime > indexed_time:
-                    # The file has changed, delete it and add it to the list of
-                    # files to reindex
-                    writer.delete_by_term('path', indexed_path)
-                    to_index.add(os_path(real_path))
-
-        count = 0
-        try:
-            work_path = work_path or target_path
-            
-            for real_path, index_path, archive_path in get_paths(work_path, indexed_paths, to_index, target_path):
-                _,ext = splitext(real_path)
-                if ext in indexables:
-                    filename = os.path.basename(real_path)
-                    if index_path not in indexed_paths or index_path in to_index:
-                        logger.info("indexing... %s", index_path)
-                        try:
-                            hdr = get_handler(ext)
-                            if hdr is None:
-                                content = "" 
-                            else:
-                                content = hdr.extract_content(real_path.encode('utf-8'))
-                            writer.add_document(title=filename, content=content,
-                                        path=std_path(index_path), filetype=ext, time=getmtime(path_join(target_path,archive_path)), real_path=std_path(archive_path))
-                            count+=1
-                        except KeyboardInterrupt:
-                            raise
-                        except:
-                            logger.exception("error occurred")
-                
-                if count % 20 == 0 and count > 0:
-                    writer.commit()
-                    logger.info("indexed %d files",count)
+def indexed_paths(ix):
+    """yield the paths stored in the documents of `ix', an index or a list of shards."""
+    for shard in (ix if isinstance(ix, list) else [ix]):
+        with shard.searcher() as searcher:
+            for fields in searcher.all_stored_fields():
+                yield fields['path']
 
-                    writer = ix.writer(limitmb=512, procs=multiprocessing.cpu_count())
-                    count = 0
+# https://whoosh.readthedocs.org/en/latest/indexing.html#incremental-indexing
+def incremental_index(ix, target_path, indexables, work_path, jobs=1, queue_size=None, cache=None, cache_only=False,
+                      spill_threshold=16 * 1024 * 1024, manifest=None, policy=None, changed_paths=None,
+                      content_limit=0, stats=None, budget=None, timeout=0, memory_limit=0, resume=False,
+                      prefilter=None):
+    """
+    indexes the changes under work_path, or only `changed_paths' if given,
+    into `ix', an index or a list of shards. the processes used are sized
+    by the MemoryBudget `budget'. contents taking more than `timeout'
+    seconds or `memory_limit' bytes to extract are quarantined until they
+    change. the files to index are queued in the manifest and leave the
+    queue as their documents are committed, with `resume' an interrupted
+    run goes on with its queue instead of walking again. files and archive
+    members the PathFilter `prefilter' leaves out are counted as skipped,
+    and dropped from the index if they were indexed. a document is stored
+    under one of the locations of its content, when that one goes it is
+    added again from another. returns the RunStats of the run.
+    """
+    stats = stats or RunStats()
+    prefilter = prefilter or PathFilter(target_path)
+    budget = budget or MemoryBudget()
+    writers = len(ix) if isinstance(ix, list) else 1
+    jobs, procs, limitmb = budget.plan(jobs, writers)
+    if budget.mb:
+        logger.info("memory budget %d MB: %d extraction jobs, %d writers of %d processes with limitmb %d",
+                    budget.mb, jobs, writers, procs, limitmb)
+    if manifest is None:
+        manifest = Manifest(":memory:")
+    
+    # digests whose locations changed, their documents are added again at
+    # the end of the run if their stored fields came from a location that
+    # is gone, or their filetypes and topdirs are not those of their
+    # locations. kept with the checkpoint so that an interrupted run leaves
+    # none behind
+    last_run = manifest.checkpoint()
+    stale = set(last_run.get('stale', [])) if last_run is not None else set()
+    
+    if manifest.is_empty():
+        with stats.timer("bootstrap"):
+            for shard in (ix if isinstance(ix, list) else [ix]):
+                bootstrap_manifest(shard, manifest)
+    elif manifest.version() < MANIFEST_VERSION:
+        with stats.timer("bootstrap"):
+            if manifest.version() < 1:
+                # documents indexed before their digests were recorded have
+                # no location, their paths are read from the index
+                manifest.index_names(indexed_paths(ix))
+            # documents indexed before they held the filetypes and topdirs
+            # of all their copies
+            for digest, locations in manifest.duplicates():
+                if any(len(values) > 1 for values in location_fields(locations).itervalues()):
+                    stale.add(digest)
+            manifest.set_version()
+    
+    def outdated(digests):
+        # the digests whose document is stored under a path that is no
+        # longer one of its locations, or has other filetypes or topdirs
+        found = set()
+        for shard in (ix if isinstance(ix, list) else [ix]):
+            with shard.searcher() as searcher:
+                reader = searcher.reader()
+                columns = dict((name, reader.column_reader(name, translate=False)) for name in ('filetype', 'topdir'))
+                for digest in digests:
+                    docnum = searcher.document_number(digest=digest)
+                    if docnum is None:
+                        continue
+                    locations = manifest.locations(digest)
+                    path = searcher.stored_fields(docnum)['path']
+                    if path not in [p for p, _ in locations] or any(
+                            sorted(v.decode('utf-8') for v in columns[name][docnum]) != values
+                            for name, values in location_fields(locations).iteritems()):
+                        found.add(digest)
+        return sorted(found)
+    
+    # archives whose members were dropped, read again by the next run
+    dropped_archives = set()
+    
+    def forget(path, rejected=False):
+        # dropped by the writer after being recorded, retried next run
+        # together with the copies recorded as its duplicates; a document
+        # the writer rejected is quarantined until it changes
+        digest = manifest.get_digest(path)
+        copies = manifest.locations(digest) if digest is not None else [(path, path)]
+        for p, real_path in copies:
+            manifest.remove_location(p)
+            if manifest.get_file(p) is not None:
+                manifest.remove_file(p)
+            else:
+                manifest.remove_member(p)
+                if real_path != p:
+                    # no mtime, the archive counts as changed
+                    manifest.set_file(real_path, None, None, None)
+                    dropped_archives.add(real_path)
+            if rejected and digest is not None:
+                manifest.quarantine(p, digest, real_path, "rejected", time.time())
+    
+    def commit():
+        manifest.set_checkpoint(dict(last_commit=time.time(), stale=sorted(stale)))
+        manifest.commit()
+    
+    if isinstance(ix, list):
+        writer = ShardedWriter(ix, policy, commit, stats, forget, procs, limitmb)
+    else:
+        writer = BatchWriter(ix, policy, commit, stats, procs, limitmb, forget)
 
+    # digest -> (fields, on_added) of the copies waiting for the copy being extracted
+    pending = {}
+    
+    def located(fields, digest, on_added):
+        manifest.set_location(fields['path'], digest, fields['real_path'])
+        on_added()
+    
+    def quarantine(fields, digest, on_added, reason):
+        # the state is recorded so that it is only tried again once it changes
+        manifest.quarantine(fields['path'], digest, fields['real_path'], reason, time.time())
+        on_added()
+    
+    def add_document(record, content, seconds, failure=None):
+        # with `replace', the document of a digest whose locations changed
+        # is added again, they are recorded already
+        fields, on_added, size, replace = record
+        digest = fields['digest']
+        stats.add_extraction(fields['path'], fields['filetype'], size, seconds)
+        copies = [] if replace else [(fields, on_added)] + pending.pop(digest, [])
+        if replace:
+            locations = manifest.locations(digest)
+        else:
+            locations = [(f['path'], f['real_path']) for f, _ in copies]
+        fields = dict(fields, **location_fields(locations))
+        if content is None:
+            if replace:
+                logger.warn("kept the document of %s as it was", fields['path'])
+            elif failure is not None:
+                for f, on_copy_added in copies:
+                    stats.add_failure(f['path'], failure)
+                    quarantine(f, digest, on_copy_added, failure)
+            return
+        try:
+            if replace:
+                writer.delete_by_term('digest', digest)
+            writer.add_document(content=content, **fields)
         except KeyboardInterrupt:
-            pass
+            raise
         except:
             logger.exception("error occurred")
+            if replace:
+                forget(fields['path'], True)
+            for f, on_copy_added in copies:
+                stats.add_failure(f['path'], "rejected")
+                quarantine(f, digest, on_copy_added, "rejected")
+            return
+        for f, on_copy_added in copies:
+            located(f, digest, on_copy_added)
+    
+    def index_content(fields, on_added, size, name, real_path=None, data=None, temp=False, indexed=False):
+        """
+        index a file or member, its content is only extracted if no other
+        location has the same digest; the other copies are recorded as
+        locations of that document. `indexed' tells whether the location
+        was indexed before.
+        """
+        try:
+            digest = content_digest(real_path, data)
+        except (IOError, OSError):
+            logger.exception("error occurred while reading %s", name)
+            digest = None
+        if digest is None or (indexed and manifest.get_digest(fields['path']) == digest):
+            if temp:
+                os.remove(real_path)
+            if digest is not None:
+                # touched, the content is the same
+                on_added()
+            return
+        if indexed:
+            release(fields['path'])
+        
+        reason = manifest.quarantined(digest)
+        if reason is not None or digest in pending or manifest.has_digest(digest):
+            if temp:
+                os.remove(real_path)
+            if digest in pending:
+                logger.info("duplicate: %s", name)
+                stats.count("duplicates")
+                pending[digest].append((fields, on_added))
+            elif reason is not None:
+                logger.info("quarantined (%s): %s", reason, name)
+                stats.count("quarantined")
+                quarantine(fields, digest, on_added, reason)
+            else:
+                logger.info("duplicate: %s", name)
+                stats.count("duplicates")
+                # possibly of another filetype or topdir
+                stale.add(digest)
+                located(fields, digest, on_added)
+            return
+        
+        logger.info("indexing... %s", name)
+        pending[digest] = []
+        pool.submit((dict(fields, digest=digest), on_added, size, False), name, fields['filetype'],
+                    real_path, data, temp, digest)
+    
+    def release(path):
+        # drop a location of a document, and the document with the last one
+        digest = manifest.get_digest(path)
+        if digest is not None and digest not in pending:
+            stale.add(digest)
+        manifest.remove_location(path)
+        manifest.unquarantine(path)
+        if digest is None:
+            # indexed before documents were keyed by content
+            writer.delete_by_term('path', path)
+        elif digest not in pending and not manifest.has_digest(digest):
+            writer.delete_by_term('digest', digest)
+    
+    def rewrite(digests):
+        # add the documents of `digests' again, each from its first location
+        # that can be read; an archive is read once for all its members
+        left = dict((digest, manifest.locations(digest)) for digest in digests)
+        while left:
+            wanted = {}
+            for digest, locations in left.items():
+                if not locations:
+                    logger.warn("no copy of %s left to index it from", digest)
+                    del left[digest]
+                    continue
+                path, real_path = locations.pop(0)
+                wanted.setdefault(real_path, {})[path] = digest
+            for real_path, paths in wanted.iteritems():
+                filepath = path_join(target_path, os_path(real_path))
+                try:
+                    st = os.stat(filepath)
+                    if real_path in paths:
+                        reindex(paths[real_path], file_fields(real_path, st), st.st_size, os_path(real_path), filepath)
+                        del left[paths[real_path]]
+                        continue
+                    _, ext = splitext(filepath)
+                    for member in archive_handlers[ext].members(filepath):
+                        index_path = path_join(os_path(real_path), os_path(member.name))
+                        digest = paths.pop(std_path(index_path), None)
+                        if digest is None:
+                            continue
+                        # read while the archive is open
+                        fields = member_fields(member, std_path(index_path), real_path, st)
+                        data, tmppath, _ = read_member(member, fields['filetype'], spill_threshold)
+                        size = len(data) if tmppath is None else os.path.getsize(tmppath)
+                        reindex(digest, fields, size, index_path, tmppath, data, tmppath is not None)
+                        del left[digest]
+                        if not paths:
+                            break
+                except KeyboardInterrupt:
+                    raise
+                except:
+                    logger.exception("error occurred while reading %s", real_path)
+    
+    def reindex(digest, fields, size, name, real_path=None, data=None, temp=False):
+        logger.info("reindexing... %s", name)
+        stats.count("reindexed")
+        pool.submit((dict(fields, digest=digest), lambda: None, size, True), name, fields['filetype'],
+                    real_path, data, temp, digest)
+    
+    def skipped(reason, name, size):
+        logger.debug("skipped (%s): %s", reason, name)
+        stats.count("skipped " + reason)
+        stats.count("skipped bytes", size or 0)
+    
+    def finished(path, size, on_added):
+        # the file leaves the queue with the commit recording it, `size' is
+        # the one queued, as the progress totals are
+        if path not in dropped_archives:
+            on_added()
+        manifest.dequeue(path)
+        progress.done(size)
+        progress.log(logger)
+    
+    def file_fields(path, st):
+        return dict(title=os.path.basename(os_path(path)), path=path, filetype=splitext(path)[1],
+                    time=st.st_mtime, real_path=path, mtime=int(st.st_mtime), topdir=top_dir(path))
+    
+    def member_fields(member, member_path, archive_path, st):
+        _, member_ext = splitext(member.name)
+        return dict(title=os.path.basename(member.name), path=member_path, filetype=member_ext,
+                    time=st.st_mtime, real_path=archive_path, member_sig=member.sig,
+                    mtime=int(st.st_mtime), topdir=top_dir(archive_path))
+    
+    def index_archive(filepath, relpath, ext, st, queued_size, indexed):
+        archive_path = std_path(relpath)
+        for member in stats.timed_iter("archives", archive_handlers[ext].members(filepath)):
+            _, member_ext = splitext(member.name)
+            if member_ext not in indexables or handlers.missing(member_ext):
+                continue
+            index_path = path_join(relpath, os_path(member.name))
+            member_path = std_path(index_path)
+            # members left out stay in `indexed', to be removed with those
+            # no longer in the archive
+            reason = "excluded" if prefilter.excluded(member_path) else prefilter.check_size(member.size)
+            if reason is not None:
+                skipped(reason, index_path, member.size)
+                continue
+            was_indexed = member_path in indexed
+            if was_indexed and indexed.pop(member_path) == member.sig and member.sig is not None:
+                continue
+            
+            fields = member_fields(member, member_path, archive_path, st)
+            on_added = partial(manifest.set_member, member_path, archive_path, member.sig)
+            check = partial(prefilter.check_magic, member_ext) if prefilter.sniff else None
+            with stats.timer("archives"):
+                data, tmppath, reason = read_member(member, member_ext, spill_threshold, check)
+            if reason is not None:
+                skipped(reason, index_path, member.size)
+                if was_indexed:
+                    release(member_path)
+                    manifest.remove_member(member_path)
+                continue
+            size = len(data) if tmppath is None else os.path.getsize(tmppath)
+            index_content(fields, on_added, size, index_path, tmppath, data, tmppath is not None, was_indexed)
+        
+        # members left over were removed from the archive
+        for member_path in indexed:
+            logger.info("remove: %s", member_path)
+            release(member_path)
+            manifest.remove_member(member_path)
+        
+        pool.then(partial(finished, archive_path, queued_size, partial(manifest.set_file, archive_path, *file_state(st))))
+    
+    def remove(path):
+        logger.info("remove: %s", path)
+        members = manifest.members(path)
+        for member_path in members:
+            release(member_path)
+        if not members:
+            release(path)
+        manifest.remove_file(path)
+    
+    work_path = work_path or target_path
+    prefix = std_path(os.path.relpath(work_path, target_path))
+    if prefix == os.path.curdir:
+        prefix = None
+    
+    removed = []
+    completed = False
+    pool = ExtractionPool(add_document, Extractor(cache, cache_only, content_limit), jobs, queue_size, stats,
+                          timeout, memory_limit)
+    try:
+        checkpoint = manifest.checkpoint()
+        if checkpoint is not None and 'files' not in checkpoint:
+            # interrupted while walking
+            checkpoint = None
+        if resume and checkpoint is None:
+            logger.info("no interrupted run to resume")
+        elif checkpoint is not None and not resume:
+            logger.info("the last run was interrupted with %d files left, starting over", manifest.queue_totals()[0])
+    
+        if resume and checkpoint is not None:
+            prefix = checkpoint['prefix']
+            full_scan = checkpoint['full_scan']
+            files_left, bytes_left = manifest.queue_totals()
+            logger.info("resuming the run started %s, last committed %s: %d of %d files left",
+                        time.ctime(checkpoint['started']),
+                        time.ctime(checkpoint['last_commit']) if 'last_commit' in checkpoint else "never",
+                        files_left, checkpoint['files'])
+        else:
+            full_scan = changed_paths is None
+            if full_scan:
+                files = get_paths(work_path, prefilter, stats)
+            else:
+                files = get_changed_paths(changed_paths, removed, prefilter, stats)
+        
+            manifest.begin_scan()
+            manifest.begin_run(dict(prefix=prefix, full_scan=full_scan, started=time.time(), stale=sorted(stale)))
+            with stats.timer("walk"):
+                for filepath, st in files:
+                    _, ext = splitext(filepath)
+                    if ext not in archive_handlers and ext not in indexables:
+                        continue
+                    # the handler is loaded the first time its extension is met,
+                    # files whose handler is missing libraries are left out
+                    if archive_handlers.missing(ext) or handlers.missing(ext):
+                        continue
+                
+                    # files left out are not seen, and dropped if they were indexed
+                    path = std_path(os.path.relpath(filepath, target_path))
+                    reason = None if ext in archive_handlers else prefilter.check_size(st.st_size)
+                    changed = file_changed(manifest.get_file(path), st)
+                    if reason is None and changed and prefilter.sniff:
+                        reason = prefilter.check_magic(ext, read_head(filepath))
+                    if reason is not None:
+                        skipped(reason, path, st.st_size)
+                        continue
+                    manifest.mark_seen(path)
+                    if changed:
+                        manifest.enqueue(path, st.st_size)
+                files_left, bytes_left = manifest.queue_totals()
+                checkpoint = dict(files=files_left, bytes=bytes_left)
+                manifest.set_checkpoint(checkpoint)
+                manifest.commit()
+    
+        progress = Progress(checkpoint['files'], checkpoint['bytes'], checkpoint['files'] - files_left,
+                            checkpoint['bytes'] - bytes_left)
+        if files_left:
+            logger.info("%d files to index, %.1f MB", files_left, bytes_left / (1024.0 * 1024))
+    
+        for path, size in manifest.queued():
+            relpath = os_path(path)
+            filepath = path_join(target_path, relpath)
+            try:
+                st = os.stat(filepath)
+            except OSError:
+                # removed since the walk, the next run drops it from the index
+                finished(path, size, lambda: None)
+                continue
+            _, ext = splitext(filepath)
+            state = manifest.get_file(path)
+            
+            if ext in archive_handlers:
+                # members are recorded as they are indexed, those of an
+                # archive left half done are not extracted again
+                indexed = manifest.members(path)
+                try:
+                    index_archive(filepath, relpath, ext, st, size, indexed)
+                except KeyboardInterrupt:
+                    raise
+                except:
+                    # retried on the next run
+                    logger.exception("error occurred while reading %s", relpath)
+            else:
+                fields = file_fields(path, st)
+                on_added = partial(finished, path, size, partial(manifest.set_file, path, *file_state(st)))
+                index_content(fields, on_added, st.st_size, relpath, filepath, indexed=state is not None)
+        
+        pool.drain()
+        
+        # files deleted since they were indexed
+        with stats.timer("removals"):
+            if full_scan:
+                for path in manifest.unseen(prefix):
+                    remove(path)
+            else:
+                for p in removed:
+                    for path in manifest.paths(std_path(os.path.relpath(p, target_path))):
+                        remove(path)
+        
+        # documents stored under a location that is gone
+        if stale:
+            writer.flush()
+            rewrite(outdated([d for d in stale if manifest.has_digest(d)]))
+        pool.close()
+        stale.clear()
+        completed = True
 
-        if count > 0:
-            writer.commit()
-            logger.info("indexed %d files",count)
+    except KeyboardInterrupt:
+        pool.terminate()
+    except:
+        pool.terminate()
+        logger.exception("error occurred")
+
+    writer.close()
+    if completed:
+        manifest.end_run()
+        manifest.commit()
+        if files_left:
+            progress.log(logger, True)
+    else:
+        logger.info("run interrupted with %d files left, continue it with --resume", manifest.queue_totals()[0])
+    
+    if cache is not None:
+        with stats.timer("cache eviction"):
+            cache.evict()
+    
+    stats.log(logger)
+    return stats
 
 def main(argv):
     
     argparser = ArgumentParser()
     argparser.add_argument("--work",type=unicode,help="the path to work on",default=None)
+    argparser.add_argument("--jobs",type=int,help="number of content extraction processes",default=None)
+    argparser.add_argument("--rebuild-from-cache",action="store_true",help="recreate the index from the extraction cache only")
+    argparser.add_argument("--defer-merge",action="store_true",help="merge segments only at the end of the run")
+    argparser.add_argument("--watch",action="store_true",help="keep indexing changes as they happen")
+    argparser.add_argument("--resume",action="store_true",help="continue an interrupted run where it stopped instead of walking again")
+    argparser.add_argument("--stats",type=str,help="write run statistics as json to this file",default=None)
+    argparser.add_argument("--profile",type=str,help="profile the run with cProfile and dump the stats to this file",default=None)
+    argparser.add_argument("--quarantined",action="store_true",help="list the files whose extraction timed out or crashed")
+    argparser.add_argument("--health",action="store_true",help="print the document, deletion and segment counts of the index")
+    argparser.add_argument("--maintain",action="store_true",help="do the merges the merge policy left for the merge window")
+    argparser.add_argument("--optimize",action="store_true",help="merge the index into one segment per shard")
     opts = argparser.parse_args(argv)
     
     work_path = opts.work
@@ -484,14 +1404,120 @@ def main(argv):
     index_path = config['index_path']
     target_path = config['target_path']
     indexables = config['indexables']
+    shards = config.get('shards', 1)
+    stem_cache_size = config.get('stem_cache_size', 50000)
+    handlers.register(".chm", "find_stuff.handlers.chm:ChmHandler",
+                      all_objects=config.get('chm_all_objects', False))
+    budget = MemoryBudget(config.get('memory_mb', 0), config.get('extract_worker_mb', 256))
+    jobs = opts.jobs or config.get('jobs') or multiprocessing.cpu_count()
+    timeout = config.get('extract_timeout', 600)
+    memory_limit = config.get('extract_memory_mb', 2048) * 1024 * 1024
+    if opts.profile and not opts.jobs:
+        # extraction has to happen in this process to show up in the profile
+        jobs = 1
+        timeout = memory_limit = 0
+    queue_size = config.get('extract_queue_size')
+    prefilter = PathFilter(target_path, config.get('exclude', []), config.get('min_size', 0),
+                           config.get('max_size_mb', 0) * 1024 * 1024, config.get('sniff_magic', True))
+    spill_threshold = config.get('spill_threshold_mb', 16) * 1024 * 1024
+    content_limit = config.get('content_limit_mb', 64) * 1024 * 1024
+    window = MergeWindow(config.get('merge_window', ""))
+    merge_policy = TieredMergePolicy(config.get('merge_segments_per_tier', 10),
+                                     max_docs=config.get('merge_max_docs', 100000), window=window,
+                                     max_deleted=config.get('merge_max_deleted', 0.3))
+    policy = CommitPolicy(config.get('commit_docs', 1000), config.get('commit_mb', 64),
+                          config.get('commit_seconds', 300),
+                          opts.defer_merge or config.get('defer_merge', False), merge_policy)
+    
+    cache = None
+    if config.get('cache_path'):
+        cache = ExtractionCache(config['cache_path'], config.get('cache_size_mb', 0) * 1024 * 1024)
+    
+    if opts.quarantined:
+        manifest_path = join(index_path, "manifest.db")
+        if exists(manifest_path):
+            manifest = Manifest(manifest_path)
+            for path, real_path, reason, when in manifest.quarantine_list():
+                print "%s  %-8s %s" % (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(when)), reason, path)
+            manifest.close()
+        return
+    
+    if opts.rebuild_from_cache:
+        if cache is None:
+            argparser.error("cache_path is not configured")
+        if exists(index_path):
+            shutil.rmtree(index_path)
     
     if not exists(index_path):
         os.makedirs(index_path)
-        ix = create_in(index_path, schema)
+        if shards > 1:
+            ix = create_shards(index_path, schema, shards)
+        else:
+            ix = create_in(index_path, schema)
     else:
-        ix = open_dir(index_path)
+        existing = len(shard_dirs(index_path))
+        if existing != (shards if shards > 1 else 0):
+            # documents are assigned to shards by hash, changing the count needs a rebuild
+            argparser.error("%s has %d shards but %d are configured, remove it to rebuild" %
+                            (index_path, existing, shards))
+        if shards > 1:
+            ix = open_shards(index_path)
+        else:
+            ix = open_dir(index_path)
+    
+    for shard in (ix if isinstance(ix, list) else [ix]):
+        upgrade_schema(shard, stem_cache_size)
+    
+    if opts.health:
+        print json.dumps(index_health(ix), indent=2, sort_keys=True)
+        return
+    
+    if opts.maintain or opts.optimize:
+        log_health(index_health(ix))
+        log_health(maintain(ix, merge_policy, opts.optimize))
+        return
+    
+    def write_stats(stats):
+        if opts.stats:
+            with open(opts.stats, "w") as fh:
+                json.dump(stats.summary(), fh, indent=2)
+    
+    profiler = None
+    if opts.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    
+    manifest = Manifest(join(index_path, "manifest.db"))
+    try:
+        write_stats(incremental_index(ix, target_path, indexables, work_path, jobs, queue_size,
+                                      cache, opts.rebuild_from_cache, spill_threshold, manifest, policy,
+                                      content_limit=content_limit, budget=budget, timeout=timeout,
+                                      memory_limit=memory_limit, resume=opts.resume, prefilter=prefilter))
         
-    incremental_index(ix, target_path, indexables, work_path)
+        if opts.watch:
+            def run(paths):
+                write_stats(incremental_index(ix, target_path, indexables, work_path, jobs, queue_size,
+                                              cache, False, spill_threshold, manifest, policy, paths,
+                                              content_limit, budget=budget, timeout=timeout,
+                                              memory_limit=memory_limit, prefilter=prefilter))
+            
+            last_check = [0]
+            def idle():
+                # merges left for the window are done once it opens
+                if not window.spec or not window.is_open() or time.time() - last_check[0] < 60:
+                    return
+                last_check[0] = time.time()
+                if needs_merge(ix, merge_policy.unlimited()):
+                    log_health(maintain(ix, merge_policy))
+            
+            watch(work_path or target_path, run, config.get('watch_debounce', 2),
+                  config.get('watch_max_delay', 30), config.get('watch_poll_interval', 60), idle)
+    finally:
+        manifest.close()
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(opts.profile)
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
     
 #     save_config(config)
 
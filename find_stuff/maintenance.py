@@ -0,0 +1,212 @@
+'''
+Created on Oct 18, 2026
+
+'''
+from collections import defaultdict
+import copy
+from logging import getLogger
+import math
+import time
+
+from whoosh.reading import SegmentReader
+
+
+logger = getLogger("indexer")
+
+class MergeWindow(object):
+    """
+    the time of day large merges may run, given as "HH:MM-HH:MM" and
+    possibly spanning midnight. an empty window is always open.
+    """
+
+    def __init__(self, spec=""):
+        self.spec = spec
+        self.start = self.end = None
+        if spec:
+            start, end = spec.split("-")
+            self.start = self._minutes(start)
+            self.end = self._minutes(end)
+
+    @staticmethod
+    def _minutes(hhmm):
+        hours, minutes = hhmm.strip().split(":")
+        return int(hours) * 60 + int(minutes)
+
+    def is_open(self, now=None):
+        if self.start is None:
+            return True
+        t = time.localtime(now)
+        minutes = t.tm_hour * 60 + t.tm_min
+        if self.start <= self.end:
+            return self.start <= minutes < self.end
+        return minutes >= self.start or minutes < self.end
+
+class TieredMergePolicy(object):
+    """
+    a whoosh merge policy. segments are grouped in tiers holding `factor'
+    times more documents each, the first one below `floor_docs', and the
+    segments of a tier are merged into one once there are `per_tier' of
+    them. while the MergeWindow `window' is closed, merges of more than
+    `max_docs' documents are left for later; while it is open, segments
+    with more than `max_deleted' of their documents deleted are rewritten
+    as well.
+    """
+
+    def __init__(self, per_tier=10, factor=10, floor_docs=1000, max_docs=0, window=None, max_deleted=0.3):
+        self.per_tier = per_tier
+        self.factor = factor
+        self.floor_docs = floor_docs
+        self.max_docs = max_docs
+        self.window = window or MergeWindow()
+        self.max_deleted = max_deleted
+
+    def unlimited(self):
+        """the same policy with the window always open, for maintenance runs."""
+        policy = copy.copy(self)
+        policy.window = MergeWindow()
+        return policy
+
+    def tier(self, docs):
+        if docs < self.floor_docs:
+            return 0
+        return int(math.log(docs / float(self.floor_docs), self.factor)) + 1
+
+    def select(self, segments):
+        """return the segments to merge."""
+        window_open = self.window.is_open()
+        tiers = {}
+        for seg in segments:
+            tiers.setdefault(self.tier(seg.doc_count()), []).append(seg)
+
+        selected = []
+        for segs in tiers.itervalues():
+            if len(segs) < self.per_tier:
+                continue
+            if self.max_docs and not window_open and sum(seg.doc_count() for seg in segs) > self.max_docs:
+                continue
+            selected.extend(segs)
+
+        if window_open and self.max_deleted:
+            selected.extend(seg for seg in segments if seg not in selected and
+                            seg.deleted_count() > self.max_deleted * seg.doc_count_all())
+        return selected
+
+    def __call__(self, writer, segments):
+        selected = self.select(segments)
+        for seg in selected:
+            reader = SegmentReader(writer.storage, writer.schema, seg)
+            writer.add_reader(reader)
+            reader.close()
+        return [seg for seg in segments if seg not in selected]
+
+class _FilledReader(object):
+    """a segment reader that also has the columns `columns', {name: {docnum: value}}."""
+
+    def __init__(self, reader, columns):
+        self._reader = reader
+        self._columns = columns
+
+    def __getattr__(self, name):
+        return getattr(self._reader, name)
+
+    def has_column(self, fieldname):
+        return fieldname in self._columns or self._reader.has_column(fieldname)
+
+    def column_reader(self, fieldname, column=None, translate=True):
+        if fieldname in self._columns:
+            return self._columns[fieldname]
+        return self._reader.column_reader(fieldname, column, translate)
+
+class Backfill(object):
+    """
+    a whoosh merge policy rewriting every segment, filling the fields
+    `fieldnames' of its documents from `derive(stored fields)', a dict of
+    values. used once when an index gains fields or columns that documents
+    can't be reindexed for, as their content isn't stored. the columns of
+    `fieldnames' are written anew, those the segments have may be of
+    another type; their terms are only added if the segments have none.
+    """
+
+    def __init__(self, fieldnames, derive):
+        self.fieldnames = fieldnames
+        self.derive = derive
+
+    def __call__(self, writer, segments):
+        for seg in segments:
+            reader = SegmentReader(writer.storage, writer.schema, seg)
+            indexed = set(reader.indexed_field_names())
+            columns = {}
+            for name in self.fieldnames:
+                column = writer.schema[name].column_type
+                if column is not None:
+                    columns[name] = defaultdict(column.default_value)
+            # the documents are renumbered from writer.docnum in the order
+            # iter_docs yields them, as add_reader does
+            docnum = writer.docnum
+            for old_docnum, stored in reader.iter_docs():
+                for name, value in self.derive(stored).iteritems():
+                    if value is None or name not in self.fieldnames:
+                        continue
+                    field = writer.schema[name]
+                    if name in columns:
+                        columns[name][old_docnum] = field.to_column_value(value)
+                    if name not in indexed:
+                        for tbytes, _, weight, vbytes in field.index(value):
+                            writer.pool.add((name, tbytes, docnum, weight, vbytes))
+                docnum += 1
+            writer.add_reader(_FilledReader(reader, columns))
+            reader.close()
+        return []
+
+def segment_bytes(storage, seg):
+    prefix = seg.segment_id()
+    return sum(storage.file_length(name) for name in storage.list() if name.startswith(prefix))
+
+def index_health(ix):
+    """return the documents, deleted documents and segments of `ix', an index or a list of shards."""
+    if isinstance(ix, list):
+        shards = [index_health(shard) for shard in ix]
+        health = {"shards": shards}
+        for key in ("docs", "deleted", "segments", "bytes"):
+            health[key] = sum(shard[key] for shard in shards)
+    else:
+        segments = [{"docs": seg.doc_count(), "deleted": seg.deleted_count(),
+                     "bytes": segment_bytes(ix.storage, seg)} for seg in ix._segments()]
+        segments.sort(key=lambda seg: -seg["docs"])
+        health = {"docs": sum(seg["docs"] for seg in segments),
+                  "deleted": sum(seg["deleted"] for seg in segments),
+                  "segments": len(segments),
+                  "bytes": sum(seg["bytes"] for seg in segments),
+                  "segment_docs": [seg["docs"] for seg in segments]}
+    total = health["docs"] + health["deleted"]
+    health["deleted_ratio"] = health["deleted"] / float(total) if total else 0.0
+    return health
+
+def log_health(health):
+    logger.info("%d docs, %d deleted (%.1f%%), %d segments, %.1f MB", health["docs"], health["deleted"],
+                health["deleted_ratio"] * 100, health["segments"], health["bytes"] / (1024.0 * 1024))
+    for i, shard in enumerate(health.get("shards", [])):
+        logger.info("  shard %d: %d docs, %d deleted, %d segments, %.1f MB", i, shard["docs"],
+                    shard["deleted"], shard["segments"], shard["bytes"] / (1024.0 * 1024))
+
+def needs_merge(ix, policy):
+    shards = ix if isinstance(ix, list) else [ix]
+    return any(policy.select(shard._segments()) for shard in shards)
+
+def maintain(ix, policy=None, optimize=False):
+    """
+    merge the segments of `ix', an index or a list of shards, as `policy'
+    would with the merge window open, or into one segment per shard with
+    `optimize'. returns the index health after.
+    """
+    for shard in (ix if isinstance(ix, list) else [ix]):
+        start = time.time()
+        before = len(shard._segments())
+        writer = shard.writer()
+        if optimize:
+            writer.commit(optimize=True)
+        else:
+            writer.commit(mergetype=(policy or TieredMergePolicy()).unlimited())
+        logger.info("merged %s: segments %d -> %d in %.1fs", shard.storage.folder, before,
+                    len(shard._segments()), time.time() - start)
+    return index_health(ix)
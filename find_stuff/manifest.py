@@ -0,0 +1,207 @@
+'''
+Created on Oct 18, 2026
+
+'''
+from itertools import chain, groupby
+import json
+from operator import itemgetter
+import sqlite3
+
+from find_stuff.names import NameIndex
+
+
+# the version of the database, in sqlite's user_version. 1: the name index
+# holds every indexed path, not only those with a location. 2: documents
+# hold the filetypes and topdirs of all their copies
+VERSION = 2
+
+class Manifest(object):
+    """
+    indexing state kept next to the whoosh index in a sqlite database:
+    size/mtime/inode of every indexed file and archive, the signature of
+    every indexed archive member, and the content digest of every indexed
+    file or member, the index holding one document per digest, the
+    quarantined contents whose extraction timed out or crashed, and the
+    files left to index by the current run with its checkpoint, so that an
+    interrupted run can be resumed. the indexed and located paths are
+    indexed by name in `names', a NameIndex. paths are relative to the
+    target path, in the form stored in the index. a `shared' manifest can
+    be used from other threads than the one opening it, one at a time.
+    """
+
+    def __init__(self, db_path, shared=False):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, check_same_thread=not shared)
+        self.conn.text_factory = unicode
+        self.conn.executescript("""
+            create table if not exists files (path text primary key, size integer, mtime real, inode integer);
+            create table if not exists members (path text primary key, archive text, sig text);
+            create index if not exists members_archive on members (archive);
+            create table if not exists locations (path text primary key, digest text, real_path text);
+            create index if not exists locations_digest on locations (digest);
+            create table if not exists quarantine (path text primary key, digest text, real_path text,
+                                                   reason text, time real);
+            create index if not exists quarantine_digest on quarantine (digest);
+            create table if not exists seen (path text primary key);
+            create table if not exists queue (path text primary key, size integer);
+            create table if not exists checkpoint (key text primary key, value text);
+        """)
+        self.names = NameIndex(self.conn)
+        self.conn.commit()
+
+    def is_empty(self):
+        return self.conn.execute("select 1 from files limit 1").fetchone() is None
+
+    def version(self):
+        return self.conn.execute("pragma user_version").fetchone()[0]
+
+    def set_version(self, version=VERSION):
+        self.conn.execute("pragma user_version = %d" % version)
+
+    def get_file(self, path):
+        """return (size, mtime, inode) of `path', None if it is not in the manifest."""
+        return self.conn.execute("select size, mtime, inode from files where path = ?", (path,)).fetchone()
+
+    def set_file(self, path, size, mtime, inode):
+        self.conn.execute("insert or replace into files (path, size, mtime, inode) values (?, ?, ?, ?)",
+                          (path, size, mtime, inode))
+
+    def remove_file(self, path):
+        self.conn.execute("delete from files where path = ?", (path,))
+        self.conn.execute("delete from members where archive = ?", (path,))
+
+    def members(self, archive):
+        """return a dictionary of member path -> signature for `archive'."""
+        return dict(self.conn.execute("select path, sig from members where archive = ?", (archive,)))
+
+    def set_member(self, path, archive, sig):
+        self.conn.execute("insert or replace into members (path, archive, sig) values (?, ?, ?)",
+                          (path, archive, sig))
+
+    def remove_member(self, path):
+        self.conn.execute("delete from members where path = ?", (path,))
+
+    def get_digest(self, path):
+        row = self.conn.execute("select digest from locations where path = ?", (path,)).fetchone()
+        return row[0] if row is not None else None
+
+    def set_location(self, path, digest, real_path):
+        self.conn.execute("insert or replace into locations (path, digest, real_path) values (?, ?, ?)",
+                          (path, digest, real_path))
+        self.names.add(path)
+
+    def remove_location(self, path):
+        self.conn.execute("delete from locations where path = ?", (path,))
+        self.names.remove(path)
+
+    def index_names(self, paths):
+        """
+        fill the name index from `paths', those of the indexed documents, and
+        the locations, for manifests made before it held every indexed path.
+        """
+        locations = [row[0] for row in self.conn.execute("select path from locations")]
+        self.names.rebuild(chain(paths, locations))
+        self.set_version(1)
+
+    def has_digest(self, digest):
+        return self.conn.execute("select 1 from locations where digest = ? limit 1", (digest,)).fetchone() is not None
+
+    def duplicates(self):
+        """yield (digest, [(path, real_path), ...]) of the contents with more than one copy."""
+        sql = ("select digest, path, real_path from locations where digest in "
+               "(select digest from locations group by digest having count(*) > 1) order by digest, path")
+        for digest, rows in groupby(self.conn.execute(sql), itemgetter(0)):
+            yield digest, [(path, real_path) for _, path, real_path in rows]
+
+    def locations(self, digest):
+        """return [(path, real_path), ...] of the copies of the content `digest'."""
+        return self.conn.execute("select path, real_path from locations where digest = ? order by path",
+                                 (digest,)).fetchall()
+
+    def quarantine(self, path, digest, real_path, reason, time):
+        self.conn.execute("insert or replace into quarantine (path, digest, real_path, reason, time) "
+                          "values (?, ?, ?, ?, ?)", (path, digest, real_path, reason, time))
+
+    def quarantined(self, digest):
+        """return why the content `digest' is quarantined, None if it is not."""
+        row = self.conn.execute("select reason from quarantine where digest = ? limit 1", (digest,)).fetchone()
+        return row[0] if row is not None else None
+
+    def unquarantine(self, path):
+        self.conn.execute("delete from quarantine where path = ?", (path,))
+
+    def quarantine_list(self):
+        """return [(path, real_path, reason, time), ...] of the quarantined files and members."""
+        return self.conn.execute("select path, real_path, reason, time from quarantine order by path").fetchall()
+
+    def begin_scan(self):
+        # paths seen by the current walk, kept on disk rather than in memory
+        # and until the run is done, a resumed run doesn't walk again
+        self.conn.execute("delete from seen")
+
+    def mark_seen(self, path):
+        self.conn.execute("insert or ignore into seen (path) values (?)", (path,))
+
+    def unseen(self, prefix=None):
+        """return the paths under `prefix' that were not seen by the current walk."""
+        sql = "select path from files where path not in (select path from seen)"
+        args = ()
+        if prefix is not None:
+            sql += " and substr(path, 1, ?) = ?"
+            args = (len(prefix) + 1, prefix + "/")
+        return [row[0] for row in self.conn.execute(sql, args)]
+
+    def paths(self, prefix):
+        """return `prefix' and the paths under it."""
+        sql = "select path from files where path = ? or substr(path, 1, ?) = ?"
+        return [row[0] for row in self.conn.execute(sql, (prefix, len(prefix) + 1, prefix + "/"))]
+
+    def begin_run(self, checkpoint):
+        """start a run, forgetting the files left by an interrupted one."""
+        self.conn.execute("delete from queue")
+        self.conn.execute("delete from checkpoint")
+        self.set_checkpoint(checkpoint)
+
+    def end_run(self):
+        self.conn.execute("delete from queue")
+        self.conn.execute("delete from checkpoint")
+
+    def checkpoint(self):
+        """return the checkpoint of the current run, None if there is none."""
+        checkpoint = dict(self.conn.execute("select key, value from checkpoint"))
+        if not checkpoint:
+            return None
+        return dict((key, json.loads(value)) for key, value in checkpoint.iteritems())
+
+    def set_checkpoint(self, checkpoint):
+        self.conn.executemany("insert or replace into checkpoint (key, value) values (?, ?)",
+                              [(key, json.dumps(value)) for key, value in checkpoint.iteritems()])
+
+    def enqueue(self, path, size):
+        self.conn.execute("insert or replace into queue (path, size) values (?, ?)", (path, size))
+
+    def dequeue(self, path):
+        self.conn.execute("delete from queue where path = ?", (path,))
+
+    def queue_totals(self):
+        """return (files, bytes) left to index by the current run."""
+        files, size = self.conn.execute("select count(*), sum(size) from queue").fetchone()
+        return files, size or 0
+
+    def queued(self, batch=1000):
+        """yield (path, size) of the files left to index by the current run, in walk order, `batch' at a time."""
+        last = 0
+        while True:
+            rows = self.conn.execute("select rowid, path, size from queue where rowid > ? order by rowid limit ?",
+                                     (last, batch)).fetchall()
+            for _, path, size in rows:
+                yield path, size
+            if len(rows) < batch:
+                return
+            last = rows[-1][0]
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,154 @@
+'''
+Created on Oct 18, 2026
+
+'''
+import fnmatch
+import posixpath
+import re
+
+
+# wildcard characters of name patterns, bracketed sets included
+wildcard_re = re.compile(r"\[[^\]]*\]|[*?]")
+fuzzy_re = re.compile(r"^(.*?)~(\d*)$")
+
+# the most trigrams of a query looked up
+MAX_GRAMS = 500
+
+def trigrams(text):
+    """the distinct trigrams of the lowercased `text', each packed into an integer."""
+    text = text.lower()
+    return set((ord(text[i]) << 42) | (ord(text[i + 1]) << 21) | ord(text[i + 2])
+               for i in range(len(text) - 2))
+
+def substring_distance(pattern, text):
+    """
+    the least edit distance between `pattern' and a substring of `text',
+    with Myers' bit-parallel algorithm: the column of the edit distance
+    matrix is kept as bit vectors of its vertical deltas.
+    """
+    m = len(pattern)
+    if m == 0 or pattern in text:
+        return 0
+    masks = {}
+    for i, c in enumerate(pattern):
+        masks[c] = masks.get(c, 0) | (1 << i)
+    full = (1 << m) - 1
+    last = 1 << (m - 1)
+    pv, mv, score = full, 0, m
+    best = m
+    for c in text:
+        eq = masks.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & full)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+            best = min(best, score)
+        ph = (ph << 1) & full
+        mh = (mh << 1) & full
+        pv = mh | (~(xv | ph) & full)
+        mv = ph & xv
+    return best
+
+class NameIndex(object):
+    """
+    a trigram index of the indexed paths, kept in the sqlite database of
+    the manifest, for finding files by name without the content index.
+    queries are substrings of the path, wildcard patterns matched against
+    the file name (or the path if they hold a "/"), or fuzzy names ending
+    with "~", optionally followed by the edit distance allowed (1 by
+    default). only the paths sharing enough trigrams with the query are
+    compared to it, fuzzy names have to share at least one.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.conn.executescript("""
+            create table if not exists names (id integer primary key, path text unique);
+            create table if not exists name_grams (gram integer, id integer, primary key (gram, id)) without rowid;
+        """)
+
+    def is_empty(self):
+        return self.conn.execute("select 1 from names limit 1").fetchone() is None
+
+    def add(self, path):
+        cursor = self.conn.execute("insert or ignore into names (path) values (?)", (path,))
+        if cursor.rowcount != 1:
+            return
+        name_id = cursor.lastrowid
+        self.conn.executemany("insert into name_grams (gram, id) values (?, ?)",
+                              [(gram, name_id) for gram in trigrams(path)])
+
+    def remove(self, path):
+        row = self.conn.execute("select id from names where path = ?", (path,)).fetchone()
+        if row is None:
+            return
+        self.conn.executemany("delete from name_grams where gram = ? and id = ?",
+                              [(gram, row[0]) for gram in trigrams(path)])
+        self.conn.execute("delete from names where id = ?", row)
+
+    def rebuild(self, paths):
+        self.conn.execute("delete from name_grams")
+        self.conn.execute("delete from names")
+        for path in paths:
+            self.add(path)
+
+    def _candidates(self, grams, least):
+        """return the paths holding at least `least' of the trigrams `grams', all paths if `least' < 1."""
+        grams = list(grams)
+        if len(grams) > MAX_GRAMS:
+            # sqlite limits the parameters of a statement, a subset of the
+            # trigrams filters as well as the matches are checked anyway
+            least -= len(grams) - MAX_GRAMS
+            grams = grams[:MAX_GRAMS]
+        if least < 1:
+            return [row[0] for row in self.conn.execute("select path from names")]
+        sql = ("select path from names where id in (select id from name_grams where gram in (%s) "
+               "group by id having count(*) >= ?)" % ",".join("?" * len(grams)))
+        return [row[0] for row in self.conn.execute(sql, grams + [least])]
+
+    def search(self, query, limit=50):
+        """return (total, [path, ...]) of the best `limit' paths matching `query'."""
+        query = query.strip()
+        m = fuzzy_re.match(query)
+        if m is not None:
+            text = m.group(1).lower()
+            distance = int(m.group(2)) if m.group(2) else 1
+            # an edit changes at most 3 trigrams of a match, comparing every
+            # path to a short query would take seconds on a large index
+            grams = trigrams(text)
+            least = max(len(grams) - 3 * distance, 1) if grams else 0
+            ranked = []
+            for path in self._candidates(grams, least):
+                name = posixpath.basename(path).lower()
+                d = substring_distance(text, name)
+                if d <= distance:
+                    ranked.append((d, len(name), path))
+        elif wildcard_re.search(query):
+            pattern = query.lower()
+            target = (lambda path: path) if "/" in pattern else posixpath.basename
+            regex = re.compile(fnmatch.translate(pattern), re.U)
+            grams = set()
+            for literal in wildcard_re.split(pattern):
+                grams |= trigrams(literal)
+            ranked = []
+            for path in self._candidates(grams, len(grams)):
+                name = target(path).lower()
+                if regex.match(name):
+                    ranked.append((len(name), path))
+        else:
+            text = query.lower()
+            grams = trigrams(text)
+            ranked = []
+            for path in self._candidates(grams, len(grams)):
+                lowered = path.lower()
+                if text not in lowered:
+                    continue
+                name = posixpath.basename(lowered)
+                # matches in the file name first
+                ranked.append((text not in name, len(name), path))
+        ranked.sort()
+        return len(ranked), [item[-1] for item in ranked[:limit]]
@@ -0,0 +1,110 @@
+'''
+Created on Oct 18, 2026
+
+'''
+import codecs
+import fnmatch
+import os
+import re
+
+
+# how much of a file is read to check its type
+HEAD_SIZE = 4096
+
+# the first bytes of the files of an extension
+MAGIC = {
+    ".pdf": ("%PDF-",),
+    ".zip": ("PK\x03\x04", "PK\x05\x06", "PK\x07\x08"),
+    ".docx": ("PK\x03\x04",),
+    ".epub": ("PK\x03\x04",),
+    ".gz": ("\x1f\x8b",),
+    ".tar.gz": ("\x1f\x8b",),
+    ".rar": ("Rar!\x1a\x07",),
+    ".chm": ("ITSF",),
+    ".djvu": ("AT&TFORM",),
+    ".rtf": ("{\\rtf",),
+}
+
+# extensions whose magic may come after some junk, and how far
+LOOSE_MAGIC = {".pdf": 1024}
+
+# text formats, which are not expected to hold NUL bytes
+TEXT_TYPES = frozenset([".txt", ".html", ".htm"])
+
+wide_boms = (codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE, codecs.BOM_UTF32_LE, codecs.BOM_UTF32_BE)
+
+def read_head(filepath):
+    """the first HEAD_SIZE bytes of `filepath', None if it can't be read."""
+    try:
+        with open(filepath, "rb") as fh:
+            return fh.read(HEAD_SIZE)
+    except (IOError, OSError):
+        return None
+
+def compile_globs(globs):
+    if not globs:
+        return None
+    return re.compile("|".join("(?:%s)" % fnmatch.translate(os.path.normcase(glob)) for glob in globs))
+
+class PathFilter(object):
+    """
+    decides from what is cheap to know, before a file is extracted, whether
+    the walk hands it on. `excludes' globs without a "/" match the name of
+    a file or directory anywhere, directories being pruned with everything
+    under them, the others the path relative to `root'. files smaller than
+    `min_size' or larger than `max_size' bytes (0 for no limit) are left
+    out, and with `sniff' those whose first bytes don't look like their
+    extension. archives are not size limited, their members are.
+    """
+
+    def __init__(self, root, excludes=(), min_size=0, max_size=0, sniff=False):
+        self.root = root
+        self.name_globs = compile_globs([glob for glob in excludes if "/" not in glob])
+        self.path_globs = compile_globs([glob for glob in excludes if "/" in glob])
+        self.min_size = min_size
+        self.max_size = max_size
+        self.sniff = sniff
+
+    def prune(self, name, filepath):
+        """whether the walk should skip the file or directory `filepath' named `name'."""
+        if self.name_globs is not None and self.name_globs.match(os.path.normcase(name)):
+            return True
+        if self.path_globs is not None:
+            path = os.path.relpath(filepath, self.root).replace(os.path.sep, "/")
+            return self.path_globs.match(os.path.normcase(path)) is not None
+        return False
+
+    def excluded(self, path):
+        """whether `path', relative to the root, or one of its directories is excluded."""
+        if self.name_globs is not None:
+            for name in path.split("/"):
+                if self.name_globs.match(os.path.normcase(name)):
+                    return True
+        return self.path_globs is not None and self.path_globs.match(os.path.normcase(path)) is not None
+
+    def check_size(self, size):
+        """return why a file of `size' bytes is left out, None if it isn't."""
+        if size is None:
+            return None
+        if size < self.min_size:
+            return "too small"
+        if self.max_size and size > self.max_size:
+            return "too large"
+        return None
+
+    def check_magic(self, ext, head):
+        """return why a file of extension `ext' starting with `head' is left out, None if it isn't."""
+        if not self.sniff or head is None:
+            return None
+        if ext in TEXT_TYPES:
+            if "\x00" in head and not head.startswith(wide_boms):
+                return "binary"
+            return None
+        magic = MAGIC.get(ext)
+        if magic is None:
+            return None
+        window = head[:LOOSE_MAGIC[ext]] if ext in LOOSE_MAGIC else None
+        for signature in magic:
+            if head.startswith(signature) or (window is not None and signature in window):
+                return None
+        return "not " + ext
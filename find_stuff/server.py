@@ -0,0 +1,114 @@
+'''
+Created on Oct 18, 2026
+
+'''
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+import json
+from logging import getLogger
+from SocketServer import ThreadingMixIn
+from urlparse import urlparse, parse_qs
+
+from find_stuff.finder import SearchOptions, parse_date
+
+
+logger = getLogger("server")
+
+MAX_PAGELEN = 100
+
+class SearchHandler(BaseHTTPRequestHandler):
+    """
+    GET /search?q=<query>&page=<n>&pagelen=<n>
+        [&type=<.ext>][&dir=<top-level dir>][&after=<YYYY-MM-DD>][&before=<YYYY-MM-DD>]
+        [&sort=newest][&counts=1]
+    GET /names?q=<substring, wildcard pattern or fuzzy name~>&limit=<n>
+    GET /status
+    """
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        finder = self.server.finder
+
+        if url.path == "/status":
+            self.send_json(200, finder.status())
+            return
+        if url.path == "/names":
+            self.find_names(finder, params)
+            return
+        if url.path != "/search":
+            self.send_json(404, {"error": "not found"})
+            return
+
+        try:
+            querystring = unicode(params.get('q', [''])[0], encoding='utf-8')
+            page = int(params.get('page', ['1'])[0])
+            pagelen = min(int(params.get('pagelen', [finder.pagelen])[0]), MAX_PAGELEN)
+            if page < 1 or pagelen < 1:
+                raise ValueError("page and pagelen must be positive")
+            options = SearchOptions(self.param(params, 'type'), self.param(params, 'dir'),
+                                    self.param(params, 'after', parse_date), self.param(params, 'before', parse_date),
+                                    params.get('sort', [''])[0] == "newest", params.get('counts', ['0'])[0] == "1")
+        except ValueError, e:
+            self.send_json(400, {"error": str(e)})
+            return
+
+        try:
+            result = finder.search(querystring, page, pagelen, options)
+        except Exception, e:
+            logger.exception("error occurred")
+            self.send_json(500, {"error": str(e)})
+            return
+        self.send_json(200, result)
+
+    def find_names(self, finder, params):
+        try:
+            querystring = unicode(params.get('q', [''])[0], encoding='utf-8')
+            limit = min(int(params.get('limit', [finder.pagelen])[0]), MAX_PAGELEN)
+            if limit < 1:
+                raise ValueError("limit must be positive")
+            result = finder.find_names(querystring, limit)
+        except ValueError, e:
+            self.send_json(400, {"error": str(e)})
+            return
+        except Exception, e:
+            logger.exception("error occurred")
+            self.send_json(500, {"error": str(e)})
+            return
+        self.send_json(200, result)
+
+    @staticmethod
+    def param(params, name, convert=None):
+        value = params.get(name, [''])[0]
+        if not value:
+            return None
+        value = unicode(value, encoding='utf-8')
+        return convert(value) if convert else value
+
+    def send_json(self, code, obj):
+        body = json.dumps(obj)
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        logger.debug("%s - %s", self.client_address[0], fmt % args)
+
+class SearchServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, address, finder):
+        HTTPServer.__init__(self, address, SearchHandler)
+        self.finder = finder
+
+def serve(finder, host="127.0.0.1", port=8080):
+    server = SearchServer((host, port), finder)
+    logger.info("serving on http://%s:%d/", host, port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,43 @@
+'''
+Created on Oct 18, 2026
+
+'''
+import os
+from os.path import isdir, join
+import re
+import zlib
+
+from whoosh.index import create_in, open_dir
+
+
+# a sharded index keeps one whoosh index per shard under index_path
+SHARD_DIR = "shard%02d"
+shard_dir_re = re.compile(r"^shard(\d+)$")
+
+def shard_of(path, count):
+    """the shard of the document with this `path', stable across runs."""
+    if isinstance(path, unicode):
+        path = path.encode('utf-8')
+    return (zlib.crc32(path) & 0xffffffff) % count
+
+def shard_dirs(index_path):
+    """return the shard directories under index_path in shard order, empty if it is not sharded."""
+    if not isdir(index_path):
+        return []
+    shards = []
+    for d in os.listdir(index_path):
+        m = shard_dir_re.match(d)
+        if m is not None:
+            shards.append((int(m.group(1)), join(index_path, d)))
+    return [path for _, path in sorted(shards)]
+
+def create_shards(index_path, schema, count):
+    shards = []
+    for i in range(count):
+        path = join(index_path, SHARD_DIR % i)
+        os.makedirs(path)
+        shards.append(create_in(path, schema))
+    return shards
+
+def open_shards(index_path):
+    return [open_dir(path) for path in shard_dirs(index_path)]
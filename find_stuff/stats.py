@@ -0,0 +1,170 @@
+'''
+Created on Oct 18, 2026
+
+'''
+from collections import defaultdict
+from contextlib import contextmanager
+import heapq
+import time
+
+
+class RunStats(object):
+    """
+    timings of an indexing run: seconds spent per stage, extraction time
+    and bytes per handler, commit durations, the `slowest' slowest files,
+    the hits of the stemming caches, counts of events such as
+    duplicates found and the files whose extraction failed.
+    """
+
+    def __init__(self, slowest=10):
+        self.started = time.time()
+        self.stages = defaultdict(float)
+        self.handlers = {}
+        self.commits = []
+        self.nslowest = slowest
+        self.slowest = []
+        self.stem_hits = 0
+        self.stem_misses = 0
+        self.stem_procs = 0
+        self.counters = defaultdict(int)
+        self.failures = []
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.stages[stage] += time.time() - start
+
+    def timed_iter(self, stage, iterable):
+        """iterate over `iterable', charging the time spent in it to `stage'."""
+        it = iter(iterable)
+        while True:
+            start = time.time()
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            finally:
+                self.stages[stage] += time.time() - start
+            yield item
+
+    def add_extraction(self, path, ext, size, seconds):
+        entry = self.handlers.setdefault(ext, {"files": 0, "bytes": 0, "seconds": 0.0})
+        entry["files"] += 1
+        entry["bytes"] += size or 0
+        entry["seconds"] += seconds
+
+        item = (seconds, path)
+        if len(self.slowest) < self.nslowest:
+            heapq.heappush(self.slowest, item)
+        else:
+            heapq.heappushpop(self.slowest, item)
+
+    def add_commit(self, seconds):
+        self.commits.append(seconds)
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def add_failure(self, path, reason):
+        self.failures.append((path, reason))
+
+    def add_stem_cache(self, hits, misses):
+        self.stem_hits += hits
+        self.stem_misses += misses
+
+    def stem_cache_unavailable(self, procs):
+        """stemming ran in `procs' writer processes, whose caches can't be read."""
+        self.stem_procs = max(self.stem_procs, procs)
+
+    def summary(self):
+        handlers = {}
+        lookups = self.stem_hits + self.stem_misses
+        for ext, entry in self.handlers.iteritems():
+            seconds = entry["seconds"] or 1e-9
+            handlers[ext] = dict(entry, mb_per_s=entry["bytes"] / seconds / (1024 * 1024))
+        return {"seconds": time.time() - self.started,
+                "stages": dict(self.stages),
+                "handlers": handlers,
+                "commits": {"count": len(self.commits),
+                            "seconds": sum(self.commits),
+                            "max_seconds": max(self.commits) if self.commits else 0},
+                "stem_cache": {"hits": self.stem_hits, "misses": self.stem_misses,
+                               "hit_rate": self.stem_hits / float(lookups) if lookups else None,
+                               "writer_procs": self.stem_procs},
+                "counters": dict(self.counters),
+                "failures": [{"path": path, "reason": reason} for path, reason in self.failures],
+                "slowest": [{"path": path, "seconds": seconds}
+                            for seconds, path in sorted(self.slowest, reverse=True)]}
+
+    def log(self, logger):
+        summary = self.summary()
+        logger.info("run took %.1fs", summary["seconds"])
+        for stage, seconds in sorted(summary["stages"].iteritems(), key=lambda item: -item[1]):
+            logger.info("  %-20s %8.2fs", stage, seconds)
+        for ext, entry in sorted(summary["handlers"].iteritems()):
+            logger.info("  %-20s %8.2fs %6d files %8.2f MB/s", "extract " + ext,
+                        entry["seconds"], entry["files"], entry["mb_per_s"])
+        commits = summary["commits"]
+        logger.info("  %d commits in %.2fs (max %.2fs)", commits["count"], commits["seconds"],
+                    commits["max_seconds"])
+        for name, n in sorted(summary["counters"].iteritems()):
+            logger.info("  %-20s %8d", name, n)
+        stem_cache = summary["stem_cache"]
+        if stem_cache["hit_rate"] is not None:
+            logger.info("  stem cache hit rate %.1f%% of %d words", stem_cache["hit_rate"] * 100,
+                        stem_cache["hits"] + stem_cache["misses"])
+        elif stem_cache["writer_procs"]:
+            logger.info("  stem cache hit rate not available, stemming runs in %d writer processes",
+                        stem_cache["writer_procs"])
+        for item in summary["failures"]:
+            logger.warn("  failed (%s): %s", item["reason"], item["path"])
+        for item in summary["slowest"]:
+            logger.info("  slow: %8.2fs %s", item["seconds"], item["path"])
+
+def format_seconds(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return "%d:%02d:%02d" % (hours, minutes, seconds)
+
+class Progress(object):
+    """
+    the files and bytes of a run done out of `files' and `size', of which
+    `files_done' and `bytes_done' were done before it was resumed. logged
+    at most every `interval' seconds with the time left estimated from the
+    bytes left and the bytes per second so far.
+    """
+
+    def __init__(self, files, size, files_done=0, bytes_done=0, interval=30):
+        self.started = time.time()
+        self.files = files
+        self.size = size
+        self.files_done = files_done
+        self.bytes_done = bytes_done
+        self.resumed_bytes = bytes_done
+        self.interval = interval
+        self.logged = self.started
+
+    def done(self, size, files=1):
+        self.files_done += files
+        self.bytes_done += size
+
+    def eta(self):
+        """seconds left, None until something is done."""
+        rate = (self.bytes_done - self.resumed_bytes) / max(time.time() - self.started, 1e-9)
+        if rate <= 0:
+            return None
+        return max(self.size - self.bytes_done, 0) / rate
+
+    def log(self, logger, force=False):
+        now = time.time()
+        if not force and now - self.logged < self.interval:
+            return
+        self.logged = now
+        eta = self.eta()
+        logger.info("progress: %d/%d files, %.1f/%.1f MB (%.1f%%), %s left", self.files_done, self.files,
+                    self.bytes_done / (1024.0 * 1024), self.size / (1024.0 * 1024),
+                    self.bytes_done * 100.0 / self.size if self.size else 100.0,
+                    format_seconds(eta) if eta is not None else "unknown")
@@ -0,0 +1,124 @@
+'''
+Created on Oct 18, 2026
+
+'''
+from logging import getLogger
+import os
+import time
+
+
+logger = getLogger("watcher")
+
+try:
+    import pyinotify
+except:
+    logger.warn("failed to import pyinotify")
+    pyinotify = None
+
+
+class ChangeQueue(object):
+    """
+    collects changed paths until no change arrived for `debounce' seconds,
+    or the oldest pending change is `max_delay' seconds old.
+    """
+
+    def __init__(self, debounce=2, max_delay=30):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.paths = set()
+        self.overflow = False
+        self.first = None
+        self.last = None
+
+    def _touch(self):
+        now = time.time()
+        if self.first is None:
+            self.first = now
+        self.last = now
+
+    def add(self, path):
+        self._touch()
+        self.paths.add(path)
+
+    def set_overflow(self):
+        self._touch()
+        self.overflow = True
+
+    def ready(self):
+        if self.first is None:
+            return False
+        now = time.time()
+        return now - self.last >= self.debounce or now - self.first >= self.max_delay
+
+    def pop(self):
+        """return the pending paths, or None if everything has to be rescanned."""
+        paths = self.paths
+        overflow = self.overflow
+        self.paths = set()
+        self.overflow = False
+        self.first = None
+        self.last = None
+
+        if overflow:
+            return None
+
+        # a queued directory is walked as a whole, drop what is under it
+        return [p for p in sorted(paths)
+                if not any(parent in paths for parent in parents(p))]
+
+def parents(path):
+    parent = os.path.dirname(path)
+    while parent and parent != path:
+        yield parent
+        path, parent = parent, os.path.dirname(parent)
+
+def poll(run, interval=60, idle=None):
+    logger.info("polling for changes every %d seconds", interval)
+    while True:
+        time.sleep(interval)
+        run(None)
+        if idle is not None:
+            idle()
+
+def watch(work_path, run, debounce=2, max_delay=30, poll_interval=60, idle=None):
+    """
+    calls `run(paths)' with the paths changed under work_path, or
+    `run(None)' when everything has to be rescanned, and `idle()' when
+    there is nothing to do. falls back to polling when inotify is not
+    available.
+    """
+    if pyinotify is None:
+        poll(run, poll_interval, idle)
+        return
+
+    queue = ChangeQueue(debounce, max_delay)
+
+    def on_event(event):
+        if event.mask & pyinotify.IN_Q_OVERFLOW:
+            logger.warn("event queue overflow, rescanning")
+            queue.set_overflow()
+        elif event.dir or not event.mask & pyinotify.IN_CREATE:
+            # new files are picked up once they are closed
+            path = event.pathname
+            if isinstance(path, str):
+                path = unicode(path, encoding='utf-8', errors='replace')
+            queue.add(path)
+
+    mask = (pyinotify.IN_CLOSE_WRITE | pyinotify.IN_CREATE | pyinotify.IN_DELETE |
+            pyinotify.IN_MOVED_FROM | pyinotify.IN_MOVED_TO | pyinotify.IN_ATTRIB)
+    wm = pyinotify.WatchManager()
+    notifier = pyinotify.Notifier(wm, on_event)
+    wm.add_watch(work_path.encode('utf-8'), mask, rec=True, auto_add=True)
+    logger.info("watching %s", work_path)
+
+    try:
+        while True:
+            if notifier.check_events(timeout=int(debounce * 1000)):
+                notifier.read_events()
+                notifier.process_events()
+            if queue.ready():
+                run(queue.pop())
+            elif idle is not None and queue.first is None:
+                idle()
+    finally:
+        notifier.stop()
@@ -5,6 +5,6 @@ setup(name='find-stuff',
       version='1.0',
       description='find-stuff',
       url='https://github.com/xpoh434/find-stuff/',
-      packages=['find_stuff'],
-      install_requires=['whoosh','pdfminer','python-djvulibre','epub','pychm','bs4']
+      packages=['find_stuff', 'find_stuff.benchmark', 'find_stuff.handlers'],
+      install_requires=['whoosh','pdfminer','python-djvulibre','epub','pychm','lxml','bs4']
      )
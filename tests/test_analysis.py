@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+'''
+Created on Oct 18, 2026
+
+'''
+import shutil
+import tempfile
+import unittest
+
+from whoosh.index import create_in
+from whoosh.qparser.default import QueryParser
+
+from find_stuff.indexer import schema, stem_ana, stem_ana2
+
+
+def texts(analyzer, text):
+    return [t.text for t in analyzer(text)]
+
+class AnalyzerTest(unittest.TestCase):
+
+    def test_mixed_token_stemmed_as_plain_word(self):
+        for analyzer in (stem_ana, stem_ana2):
+            self.assertEqual(texts(analyzer, u"databases数据库")[0], texts(analyzer, u"databases")[0])
+            self.assertEqual(texts(analyzer, u"中文running")[-1], texts(analyzer, u"running")[0])
+
+    def test_mixed_token_stop_words(self):
+        self.assertEqual(texts(stem_ana, u"the中文"), [u"中", u"中文", u"文"])
+
+    def test_cjk_unigrams_and_bigrams(self):
+        tokens = [(t.text, t.pos) for t in stem_ana(u"Some 数据库 files", positions=True)]
+        self.assertEqual(tokens, [(u"some", 0), (u"数", 1), (u"数据", 1), (u"据", 2), (u"据库", 2),
+                                  (u"库", 3), (u"file", 4)])
+
+    def test_stop_words_renumbered(self):
+        tokens = [(t.text, t.pos) for t in stem_ana(u"the中文 of files", positions=True)]
+        self.assertEqual(tokens, [(u"中", 1), (u"中文", 1), (u"文", 2), (u"file", 3)])
+
+class MixedTokenSearchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.ix = create_in(self.dir, schema)
+        writer = self.ix.writer()
+        writer.add_document(title=u"databases数据库", content=u"中文running databases数据库", path=u"/a")
+        writer.add_document(title=u"databases", content=u"running databases", path=u"/b")
+        writer.commit()
+
+    def tearDown(self):
+        self.ix.close()
+        shutil.rmtree(self.dir)
+
+    def search(self, field, text):
+        with self.ix.searcher() as searcher:
+            q = QueryParser(field, self.ix.schema).parse(text)
+            return sorted(hit["path"] for hit in searcher.search(q))
+
+    def test_latin_part_matches_plain_word(self):
+        for field in ("title", "content"):
+            self.assertEqual(self.search(field, u"databases"), [u"/a", u"/b"])
+        self.assertEqual(self.search("content", u"running"), [u"/a", u"/b"])
+
+    def test_cjk_part_matches(self):
+        self.assertEqual(self.search("content", u"数据库"), [u"/a"])
+        self.assertEqual(self.search("content", u"中文"), [u"/a"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+'''
+Created on Oct 18, 2026
+
+'''
+import os
+import shutil
+import tempfile
+import unittest
+
+from find_stuff.cache import ExtractionCache
+
+
+class ExtractionCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def walked(self, cache):
+        # evict walks the cache with os.walk, count the walks from its top
+        walks = []
+        real_walk = os.walk
+        def walk(path, *args, **kwargs):
+            if path == self.dir:
+                walks.append(path)
+            return real_walk(path, *args, **kwargs)
+        os.walk = walk
+        try:
+            cache.evict()
+        finally:
+            os.walk = real_walk
+        return len(walks)
+
+    def test_put_get(self):
+        cache = ExtractionCache(self.dir, 1 << 20)
+        key = cache.key("digest", object())
+        self.assertEqual(cache.get(key), None)
+        cache.put(key, u"content 中")
+        self.assertEqual(cache.get(key), u"content 中")
+
+    def test_evict_walks_only_above_budget(self):
+        cache = ExtractionCache(self.dir, 1 << 20)
+        cache.put(cache.key("a", object()), u"a" * 100)
+        # the size isn't known before the first walk
+        self.assertEqual(cache.size(), None)
+        self.assertEqual(self.walked(cache), 1)
+        size = cache.size()
+        self.assertTrue(size > 0)
+
+        cache.put(cache.key("b", object()), u"b" * 100)
+        self.assertTrue(cache.size() > size)
+        self.assertEqual(self.walked(cache), 0)
+
+    def test_evict_least_recently_used(self):
+        cache = ExtractionCache(self.dir, 1)
+        keys = [cache.key(str(i), object()) for i in range(3)]
+        for key in keys:
+            cache.put(key, os.urandom(64).encode('hex').decode('ascii'))
+        self.assertEqual(cache.evict(), 3)
+        self.assertEqual(cache.size(), 0)
+        self.assertEqual([cache.get(key) for key in keys], [None] * 3)
+
+if __name__ == '__main__':
+    unittest.main()
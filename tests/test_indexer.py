@@ -0,0 +1,228 @@
+'''
+Created on Oct 18, 2026
+
+'''
+import os
+from os.path import dirname, join
+import shutil
+import tempfile
+import time
+import unittest
+
+from whoosh.index import create_in
+
+from find_stuff import indexer
+from find_stuff.finder import Finder, SearchOptions, ShardedFinder
+from find_stuff.indexer import MemoryBudget, incremental_index, schema
+from find_stuff.manifest import Manifest
+from find_stuff.shards import create_shards, shard_dirs
+
+
+class OneProcess(MemoryBudget):
+    """extraction and writing in this process, as the tests expect."""
+
+    def plan(self, jobs, writers=1):
+        return 1, 1, 64
+
+class FailingHandler(object):
+
+    def __init__(self):
+        self.calls = 0
+
+    def extract_content(self, filepath, limit=0):
+        self.calls += 1
+        raise MemoryError()
+
+class IncrementalIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.target = join(self.dir, "docs")
+        self.index = join(self.dir, "index")
+        os.makedirs(self.target)
+        os.makedirs(self.index)
+        self.ix = create_in(self.index, schema)
+        self.manifest = Manifest(join(self.index, "manifest.db"))
+
+    def tearDown(self):
+        self.manifest.close()
+        shutil.rmtree(self.dir)
+
+    def write(self, path, content):
+        filepath = join(self.target, path)
+        if not os.path.isdir(dirname(filepath)):
+            os.makedirs(dirname(filepath))
+        with open(filepath, "w") as fh:
+            fh.write(content)
+        # a different mtime than the one indexed
+        st = os.stat(filepath)
+        os.utime(filepath, (st.st_atime, st.st_mtime + 10))
+
+    def run_indexer(self, indexables=(".txt",), **kwargs):
+        return incremental_index(self.ix, self.target, list(indexables), self.target, manifest=self.manifest,
+                                 budget=OneProcess(), **kwargs)
+
+    def documents(self):
+        with self.ix.searcher() as searcher:
+            return sorted(searcher.all_stored_fields(), key=lambda fields: fields['path'])
+
+    def search(self, querystring, **options):
+        return self.results(querystring, **options)['hits']
+
+    def results(self, querystring, **options):
+        finder = Finder(self.ix, manifest_path=join(self.index, "manifest.db"))
+        try:
+            return finder.search(querystring, options=SearchOptions(**options))
+        finally:
+            finder.close()
+
+    def test_duplicates_share_a_document(self):
+        self.write("a/x.txt", "shared words")
+        self.write("b/y.txt", "shared words")
+        self.write("b/z.txt", "other words")
+        stats = self.run_indexer()
+        self.assertEqual(len(self.documents()), 2)
+        self.assertEqual(stats.counters["duplicates"], 1)
+        hits = self.search(u"shared")
+        self.assertEqual(len(hits), 1)
+        self.assertEqual(hits[0]['paths'], ["a/x.txt", "b/y.txt"])
+
+    def stored_and_other(self, paths=("a/x.txt", "b/y.txt")):
+        # the copy the document is stored under, and the other one
+        stored = self.documents()[0]['path']
+        return stored, (set(paths) - {stored}).pop()
+
+    def test_release_rewrites_under_a_surviving_copy(self):
+        self.write("a/x.txt", "shared words")
+        self.write("b/y.txt", "shared words")
+        self.run_indexer()
+        stored, other = self.stored_and_other()
+        os.remove(join(self.target, stored))
+        stats = self.run_indexer()
+        self.assertEqual(stats.counters["reindexed"], 1)
+        documents = self.documents()
+        self.assertEqual([(d['path'], d['real_path'], d['title']) for d in documents],
+                         [(other, other, os.path.basename(other))])
+        self.assertEqual([hit['path'] for hit in self.search(u"title:" + os.path.basename(other))], [other])
+        self.assertEqual(self.search(u"title:" + os.path.basename(stored)), [])
+        # nothing left to do
+        stats = self.run_indexer()
+        self.assertEqual(stats.counters["reindexed"], 0)
+
+    def test_release_of_another_copy_keeps_the_document(self):
+        self.write("a/x.txt", "shared words")
+        self.write("a/y.txt", "shared words")
+        self.run_indexer()
+        stored, other = self.stored_and_other(("a/x.txt", "a/y.txt"))
+        os.remove(join(self.target, other))
+        stats = self.run_indexer()
+        self.assertEqual(stats.counters["reindexed"], 0)
+        self.assertEqual([d['path'] for d in self.documents()], [stored])
+        self.assertEqual(self.search(u"shared")[0]['paths'], [stored])
+
+    def test_removed_and_changed_files(self):
+        self.write("a/x.txt", "first words")
+        self.write("a/y.txt", "second words")
+        self.run_indexer()
+        os.remove(join(self.target, "a", "x.txt"))
+        self.write("a/y.txt", "changed content")
+        self.run_indexer()
+        self.assertEqual([d['path'] for d in self.documents()], ["a/y.txt"])
+        self.assertEqual(self.search(u"first"), [])
+        self.assertEqual(self.search(u"second"), [])
+        self.assertEqual([hit['path'] for hit in self.search(u"changed")], ["a/y.txt"])
+
+    def test_rename(self):
+        self.write("newdir/x.txt", "moving words")
+        self.run_indexer()
+        os.rename(join(self.target, "newdir"), join(self.target, "moved"))
+        self.run_indexer()
+        hits = self.search(u"moving")
+        self.assertEqual([(hit['path'], hit['paths']) for hit in hits], [("moved/x.txt", ["moved/x.txt"])])
+        self.assertEqual(self.manifest.get_digest(u"newdir/x.txt"), None)
+        self.assertEqual(len(self.search(u"moving", topdir=u"moved")), 1)
+        self.assertEqual(self.search(u"moving", topdir=u"newdir"), [])
+
+    def test_duplicates_in_two_directories(self):
+        self.write("a/x.txt", "shared words")
+        self.write("b/y.html", "shared words")
+        self.run_indexer((".txt", ".html"))
+        for topdir in (u"a", u"b"):
+            self.assertEqual(len(self.search(u"shared", topdir=topdir)), 1)
+        for filetype in (u".txt", u".html"):
+            self.assertEqual(len(self.search(u"shared", filetype=filetype)), 1)
+        self.assertEqual(self.results(u"shared", counts=True)['counts'], {".txt": 1, ".html": 1})
+        # the copies left, whichever the document is stored under
+        os.remove(join(self.target, "b", "y.html"))
+        self.run_indexer((".txt", ".html"))
+        self.assertEqual(self.search(u"shared", topdir=u"b"), [])
+        self.assertEqual(self.search(u"shared", filetype=u".html"), [])
+        self.assertEqual(len(self.search(u"shared", topdir=u"a", filetype=u".txt")), 1)
+        self.assertEqual(self.results(u"shared", counts=True)['counts'], {".txt": 1})
+
+    def test_quarantine(self):
+        handler = indexer.handlers[".bad"] = FailingHandler()
+        try:
+            self.write("a/x.bad", "too much")
+            self.run_indexer((".txt", ".bad"))
+            self.assertEqual([row[0] for row in self.manifest.quarantine_list()], ["a/x.bad"])
+            self.assertEqual(self.documents(), [])
+            # tried again only once it changes
+            self.run_indexer((".txt", ".bad"))
+            self.assertEqual(handler.calls, 1)
+            self.write("a/x.bad", "something else")
+            indexer.handlers[".bad"] = indexer.TxtHandler()
+            self.run_indexer((".txt", ".bad"))
+            self.assertEqual([d['path'] for d in self.documents()], ["a/x.bad"])
+            self.assertEqual(self.manifest.quarantine_list(), [])
+        finally:
+            indexer.handlers.specs.pop(".bad")
+
+    def test_resume(self):
+        self.write("a/x.txt", "first words")
+        self.write("a/y.txt", "second words")
+        # a run interrupted with y.txt left to index
+        self.manifest.begin_run(dict(prefix=None, full_scan=False, started=time.time()))
+        self.manifest.enqueue(u"a/y.txt", 12)
+        self.manifest.set_checkpoint(dict(files=2, bytes=24))
+        self.manifest.commit()
+        self.run_indexer(resume=True)
+        self.assertEqual([d['path'] for d in self.documents()], ["a/y.txt"])
+        self.assertEqual(self.manifest.checkpoint(), None)
+        self.run_indexer()
+        self.assertEqual([d['path'] for d in self.documents()], ["a/x.txt", "a/y.txt"])
+
+class ShardedIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.target = join(self.dir, "docs")
+        self.index = join(self.dir, "index")
+        os.makedirs(self.target)
+        self.shards = create_shards(self.index, schema, 3)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_pages(self):
+        for i in range(10):
+            with open(join(self.target, "f%d.txt" % i), "w") as fh:
+                fh.write("common words " + "more " * i)
+        manifest = Manifest(join(self.index, "manifest.db"))
+        try:
+            incremental_index(self.shards, self.target, [".txt"], self.target, manifest=manifest,
+                              budget=OneProcess())
+        finally:
+            manifest.close()
+        finder = ShardedFinder(shard_dirs(self.index), manifest_path=join(self.index, "manifest.db"))
+        try:
+            everything = finder.search(u"common", 1, 10)
+            self.assertEqual(everything['total'], 10)
+            pages = [finder.search(u"common", page, 4) for page in (1, 2, 3)]
+        finally:
+            finder.close()
+        self.assertEqual([page['pagecount'] for page in pages], [3, 3, 3])
+        paged = [hit['path'] for page in pages for hit in page['hits']]
+        self.assertEqual(paged, [hit['path'] for hit in everything['hits']])
+        self.assertEqual([hit['rank'] for page in pages for hit in page['hits']], range(10))
+        self.assertEqual(sorted(paged), sorted("f%d.txt" % i for i in range(10)))